@@ -0,0 +1,87 @@
+"""Micro-benchmark for src.utils.json_repair.fix_json.
+
+Usage:
+    python benchmarks/bench_json_repair.py [payload.json ...]
+
+Pass raw ``courses.content`` / ``courses.test`` exports to time real payloads.
+Without arguments it builds LLM-style course payloads of 100-500 KB (raw
+newlines in strings, trailing commas, smart quotes).
+"""
+import json
+import pathlib
+import random
+import sys
+import timeit
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+from src.utils.json_repair import fix_json  # noqa: E402
+
+
+def legacy_fix_json(s: str) -> str:
+    """The previous per-character implementation, kept for comparison"""
+    out, ins, esc = "", False, False
+    for ch in s:
+        if ins:
+            if esc:
+                out += ch; esc = False
+            elif ch == "\\":
+                out += ch; esc = True
+            elif ch == '"':
+                out += ch; ins = False
+            elif ch == "\n":
+                out += "\\n"
+            else:
+                out += ch
+        else:
+            out += ch
+            if ch == '"':
+                ins = True
+    return out
+
+
+def synthetic_payload(target_bytes: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    words = "learning model data system network process value function course week".split()
+
+    def text(n):
+        return " ".join(rng.choice(words) for _ in range(n))
+
+    weeks, size, week = [], 0, 0
+    while size < target_bytes:
+        week += 1
+        paragraphs = []
+        for i in range(8):
+            body = "\n".join(text(40) for _ in range(6))  # raw newlines, as LLMs emit
+            paragraphs.append(
+                f'{{"paragraph_title": "{text(5)}", "text": "{body}", '
+                f'"resources": ["https://example.com/{week}/{i}",],}}'
+            )
+            size += len(body) + 120
+        weeks.append(f'{{"week_number": {week}, "paragraphs": [{", ".join(paragraphs)}]}}')
+    return (
+        '{"parameters": {"duration": "%d weeks", "course_content": [%s]}, '
+        '"introduction": “%s”}' % (week, ", ".join(weeks), text(30))
+    )
+
+
+def main(paths):
+    if paths:
+        payloads = [(p, pathlib.Path(p).read_text(encoding="utf-8")) for p in paths]
+    else:
+        payloads = [(f"synthetic {kb} KB", synthetic_payload(kb * 1024)) for kb in (100, 250, 500)]
+
+    for name, payload in payloads:
+        repaired = fix_json(payload)
+        json.loads(repaired)  # the repaired payload must parse
+        runs = 5
+        new = min(timeit.repeat(lambda: fix_json(payload), number=1, repeat=runs))
+        old = min(timeit.repeat(lambda: legacy_fix_json(payload), number=1, repeat=runs))
+        print(
+            f"{name:>20}: {len(payload) / 1024:7.1f} KB  "
+            f"fix_json {new * 1000:7.2f} ms  legacy {old * 1000:7.2f} ms  ({old / new:5.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
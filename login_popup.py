@@ -1,15 +1,5 @@
 import streamlit as st
-from supabase import create_client, Client
-
-# Supabase credentials (ensure these match your other pages)
-SUPABASE_URL = "https://fcyutudqmkhrywffsjky.supabase.co"
-SUPABASE_ANON_KEY = (
-    "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9."
-    "eyJpc3MiOiJzdXBhYmFzZSIsInJlZiI6ImZjeXV0dWRxbWtocnl3ZmZzamt5Iiwicm9sZSI6ImFub24iLC"
-    "JpYXQiOjE3NDI0MjQ3OTAsImV4cCI6MjA1ODAwMDc5MH0."
-    "IucZQwgH1CFYFCgb9E3-TV7I-NOnPq9-3lmrWc4ZE7I"
-)
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+from src.api.client_pool import get_supabase
 
 def display_login_popup():
     # Use session state for user authentication
@@ -26,7 +16,7 @@ def display_login_popup():
                 login_submitted = st.form_submit_button("Log in with Email")
             if login_submitted:
                 try:
-                    auth_resp = supabase.auth.sign_in_with_password({"email": email, "password": password})
+                    auth_resp = get_supabase().auth.sign_in_with_password({"email": email, "password": password})
                     user = auth_resp.user
                     if user:
                         st.session_state["user"] = {"id": user.id, "email": user.email, "name": user.user_metadata.get("name", "")}
@@ -4,7 +4,8 @@ from typing import Dict, Any, List, Tuple
 from uuid import UUID
 
 import streamlit as st
-from supabase import create_client, Client
+from supabase import Client
+from src.api.client_pool import get_supabase
 from login_popup import display_login_popup
 import pandas as pd
 import matplotlib.pyplot as plt  # noqa: F401 chart exec
@@ -14,6 +15,12 @@ from src.components.floating_container import render_floating_container
 import pathlib
 import io
 from src.utils.xp_manager import xp_manager
+from src.utils.profile_loader import profile_loader
+from src.utils.json_repair import clean_json, fix_json
+from src.utils.course_model import completion_counts, get_course_model, model_source
+from src.api.explanations import explanation_engine
+from src.api.explanation_prefetch import explanation_prefetcher
+from src.utils.progress_buffer import progress_buffer
 import os
 
 # Import PIL components separately
@@ -27,6 +34,9 @@ client = OpenAI(
     organization=st.secrets["openai"]["org_id"]
 )
 
+# Columns the page reads on every rerun (no content, test, project or course_img)
+VIEW_COLUMNS = "id, updated_at, blob_hash, progress, completed, completition, course_length, course_notes, week_count, last_week_items"
+
 # ────────────────────────── UTILITIES ──────────────────────────
 display_login_popup()
 def is_valid_uuid(val: str) -> bool:
@@ -37,102 +47,15 @@ def is_valid_uuid(val: str) -> bool:
         return False
 
 
-def clean_json(s: str) -> str:
-    """Remove code-block fencing and whitespace around JSON strings."""
-    return re.sub(r"`(?:json|python)?\n?|\n`", "", s).strip()
-
-
-def fix_json(s: str) -> str:
-    """Escape stray newlines inside JSON string literals so json.loads succeeds."""
-    out, ins, esc = "", False, False
-    for ch in s:
-        if ins:
-            if esc:
-                out += ch; esc = False
-            elif ch == "\\":
-                out += ch; esc = True
-            elif ch == '"':
-                out += ch; ins = False
-            elif ch == "\n":
-                out += "\\n"
-            else:
-                out += ch
-        else:
-            out += ch
-            if ch == '"':
-                ins = True
-    return out
-
-
-def extract_links(html: str) -> List[Tuple[str, str]]:
-    """Return [(text, href), …] pairs from <a href="…">text</a> snippets."""
-    pattern = re.compile(r"<a\s[^>]*href=['\"](.*?)['\"][^>]*>(.*?)</a>", re.I | re.S)
-    return [(m.group(2).strip(), m.group(1).strip()) for m in pattern.finditer(html)]
-
-
-def parse_scheme(scheme: str, duration: int) -> Dict[str, Any]:
-    """Convert raw multi-paragraph scheme string → dict[WeekX]['paragraphs']"""
-    course: Dict[str, Any] = {}
-    if re.search(r"Week\s+\d+:", scheme):
-        blocks = re.split(r"(?=Week\s+\d+:)", scheme)
-        for block in blocks:
-            m = re.match(r"Week\s+(\d+):\s*(.*)", block, re.S)
-            if not m:
-                continue
-            wk, payload = int(m.group(1)), m.group(2)
-            course[f"Week{wk}"] = {"paragraphs": {}}
-            paras = re.findall(
-                r"Paragraph\s+\d+:\s*(.*?)(?=\nParagraph\s+\d+:|\nWeek\s+\d+:|\Z)",
-                payload, re.S
-            )
-            for idx, p in enumerate(paras, 1):
-                course[f"Week{wk}"]["paragraphs"][f"Paragraph{idx}"] = {
-                    "text": p.strip(),
-                    "resources": extract_links(p)
-                }
-    else:
-        paras = re.findall(r"Paragraph\s+\d+:\s*(.*?)(?=\nParagraph\s+\d+:|\Z)", scheme, re.S) or [scheme]
-        course["Week1"] = {"paragraphs": {}}
-        for idx, p in enumerate(paras, 1):
-            course["Week1"]["paragraphs"][f"Paragraph{idx}"] = {
-                "text": p.strip(),
-                "resources": extract_links(p)
-            }
-    for i in range(1, duration + 1):
-        course.setdefault(f"Week{i}", {"paragraphs": {}})
-    return course
-
-def update_course_completion(supabase: Client, course_id: str, course_dict: Dict[str, Any]) -> None:
-    """Update course progress status when all paragraphs are viewed"""
-    try:
-        # Update course progress status
-        supabase.table("courses").update({"progress": True}).eq("id", course_id).execute()
-        
-        # Get current user's XP
-        user_id = st.session_state["user"]["id"]
-        response = supabase.table("user_profile").select("xp").eq("user_id", user_id).execute()
-        
-        if response.data:
-            current_xp = response.data[0].get("xp", 0) or 0
-            # Add 100 XP for completing the course
-            new_xp = current_xp + 100
-            # Update user's XP
-            supabase.table("user_profile").update({"xp": new_xp}).eq("user_id", user_id).execute()
-            
-    except Exception as e:
-        st.error(f"Could not update course progress status: {e}")
-
-def update_course_final_completion(supabase: Client, course_id: str) -> None:
+def update_course_final_completion(supabase: Client, course_id: str, completed: bool) -> None:
     """Update course completed status when all tests are completed"""
     try:
-        # Get current completion status
-        response = supabase.table("courses").select("completed").eq("id", course_id).single().execute()
-        if not response.data.get("completed", False):
+        if not completed:
             # Update completed status to true
             supabase.table("courses").update({"completed": True}).eq("id", course_id).execute()
             # Add XP reward for course completion
             user_id = st.session_state["user"]["id"]
-            xp_manager.reward_course_completion(user_id)
+            xp_manager.reward_course_completion(user_id, course_id)
     except Exception as e:
         st.error(f"Could not update final completion status: {e}")
 
@@ -155,66 +78,42 @@ if not course_id:
 if not is_valid_uuid(course_id):
     st.error("Invalid course ID."); st.stop()
 
-SUPABASE_URL = "https://fcyutudqmkhrywffsjky.supabase.co"
-SUPABASE_ANON_KEY = (
-    "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9."
-    "eyJpc3MiOiJzdXBhYmFzZSIsInJlZiI6ImZjeXV0dWRxbWtocnl3ZmZzamt5Iiwicm9sZSI6ImFub24iLCJpYXQiOjE3NDI0MjQ3OTAsImV4cCI6MjA1ODAwMDc5MH0."
-    "IucZQwgH1CFYFCgb9E3-TV7I-NOnPq9-3lmrWc4ZE7I"
-)
-
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-row = supabase.table("courses").select("*").eq("id", course_id).single().execute().data
+supabase: Client = get_supabase()
+# One projected query per rerun; content comes from the model cache and the
+# heavy test/project columns are fetched only when their dialog opens.
+# course_content/course_project resolve a saved copy's shared blob
+row = supabase.table("courses").select(VIEW_COLUMNS).eq("id", course_id).single().execute().data
 if not row:
     st.error("Course not found."); st.stop()
 
 # Initialize notes after we have the row data
 if "notes" not in st.session_state:
-    st.session_state.notes = row.get("notes", "")
+    st.session_state.notes = row.get("course_notes") or ""
 
-test_content = row.get("test")
+def load_course_column(column: str) -> Any:
+    """Fetch a single heavy column of the current course"""
+    data = supabase.table("courses").select(column).eq("id", course_id).single().execute().data
+    return data.get(column) if data else None
 
-# parse content
-raw_content = row.get("content")
-if isinstance(raw_content, dict):
-    content = raw_content
-elif isinstance(raw_content, str):
-    try:
-        content = json.loads(fix_json(clean_json(raw_content)))
-    except json.JSONDecodeError:
-        content = {}
-else:
-    content = {}
-if not content:
+# normalized course model, parsed once per (course_id, updated_at); saved copies
+# share an immutable blob, so all of them reuse one model
+model = get_course_model(*model_source(course_id, row), lambda: load_course_column("course_content"))
+if not model:
     st.error("Course content is missing or malformed."); st.stop()
 
-# build course structure
-params = content.get("parameters", {})
-m = re.match(r"(\d+)", params.get("duration", "1"))
-if m:
-    duration = int(m.group(1))
-else:
-    duration = int(params.get("duration", 1) or 1)
-max_week = duration
-course_dict: Dict[str, Any] = {}
+# The server verifies completion against counts from this parser, which
+# repairs LLM JSON that Postgres cannot read; store them once per content version
+counts = completion_counts(model)
+if (row.get("week_count"), row.get("last_week_items")) != counts:
+    try:
+        supabase.table("courses").update({"week_count": counts[0], "last_week_items": counts[1]}).eq("id", course_id).execute()
+    except Exception:
+        pass
 
-if "course_content" in params:
-    for wk_item in params["course_content"]:
-        wk = int(wk_item.get("week_number", 1))
-        key = f"Week{wk}"
-        course_dict[key] = {
-            "paragraphs": {},
-            "supplemental": wk_item.get("supplemental_material", {})
-        }
-        for idx, para in enumerate(wk_item.get("paragraphs", []), 1):
-            course_dict[key]["paragraphs"][f"Paragraph{idx}"] = {
-                "title": para.get("paragraph_title", ""),
-                "text": para.get("text", ""),
-                "resources": [(u, u) for u in para.get("resources", [])]
-            }
-    for i in range(1, duration+1):
-        course_dict.setdefault(f"Week{i}", {"paragraphs": {}, "supplemental": {}})
-else:
-    course_dict = parse_scheme(content.get("scheme", ""), duration)
+duration = model["duration"]
+max_week = duration
+course_dict: Dict[str, Any] = model["course_dict"]
+subject = model["subject"]
 
 # collect ordered keys for progress
 wk = st.session_state.current_week
@@ -229,7 +128,7 @@ init_flag = f"initialized_{course_id}_{wk}"
 if init_flag not in st.session_state:
     stored = 0
     try:
-        stored = int(row.get("progress") or 0)
+        stored = int(progress_buffer.current(course_id, row.get("progress") or 0))
     except Exception:
         pass
     for i, key in enumerate(checkbox_keys):
@@ -252,16 +151,17 @@ def on_checkbox_change(changed_key):
     
     # count done
     done = sum(st.session_state.get(k, False) for k in checkbox_keys)
-    try:
-        supabase.table("courses").update({"progress": done}).eq("id", course_id).execute()
-        # Check if all checkboxes across all weeks are checked
-        update_course_completion(supabase, course_id, course_dict)
-    except Exception as e:
-        st.error(f"Could not update progress: {e}")
+    # Buffered; the server detects completion and awards the XP once
+    progress_buffer.record(course_id, done, wk, duration, len(checkbox_keys))
 
 # dialog for test
 @st.dialog("Knowledge Check", width="large")
 def show_test_dialog():
+    # Loaded once per session when the dialog first opens
+    test_key = f"course_test_{course_id}"
+    if test_key not in st.session_state:
+        st.session_state[test_key] = load_course_column("test")
+    test_content = st.session_state[test_key]
     data = {}
     if isinstance(test_content, str):
         try:
@@ -281,10 +181,9 @@ def show_test_dialog():
         wrong = sum(1 for i, q in enumerate(data.get("questions", [])) if answers.get(i) != q.get("correct_answer"))
         if wrong <= 1:
             try:
-                # Get current completion status
-                comp = supabase.table("courses").select("completition, course_length").eq("id", course_id).single().execute().data
-                curr = int(comp.get("completition") or 0)
-                course_length = int(comp.get("course_length") or 1)
+                # Completion status comes from this rerun's row
+                curr = int(row.get("completition") or 0)
+                course_length = int(row.get("course_length") or 1)
                 
                 # Update completion value
                 new_completion = curr + 1
@@ -303,7 +202,6 @@ def show_test_dialog():
             st.error(f"{wrong} mistakes—max is 1.")
 
 # main layout
-subject = content.get("topic", params.get("main_subject", "Untitled Course"))
 st.title(f"{subject} — Week {wk}")
 
 # Calculate progress variables before columns
@@ -317,12 +215,7 @@ if f"current_para_{wk}" not in st.session_state:
 current_para_idx = st.session_state[f"current_para_{wk}"]
 
 # Check if course is completed
-try:
-    course_status = supabase.table("courses").select("completed").eq("id", course_id).single().execute().data
-    show_congrats = course_status.get("completed", False)
-except Exception as e:
-    st.error(f"Could not verify course completion status: {e}")
-    show_congrats = False
+show_congrats = bool(row.get("completed", False))
 
 # Create columns based on whether congratulations should be shown
 if show_congrats:
@@ -357,8 +250,7 @@ with col_left:
                 if st.button("Certification", use_container_width=True):
                     # Get user's name from Supabase
                     user_id = st.session_state["user"]["id"]
-                    response = supabase.table("user_profile").select("profile_name").eq("user_id", user_id).execute()
-                    user_name = response.data[0].get("profile_name") if response.data else "Unnamed User"
+                    user_name = profile_loader.load(user_id).get("profile_name") or "Unnamed User"
                     
                     # Generate 9-digit course ID from UUID
                     course_id_9digits = str(abs(hash(course_id)))[:9]
@@ -411,7 +303,14 @@ with col_left:
         # Only show one paragraph container at a time
         if para_keys:
             pid = para_keys[current_para_idx]
-            para = course_dict.get(f"Week{wk}", {}).get("paragraphs", {}).get(pid, {})
+            week_paragraphs = course_dict.get(f"Week{wk}", {}).get("paragraphs", {})
+            para = week_paragraphs.get(pid, {})
+            # Warm explanations for the next paragraphs while this one is read
+            if st.session_state.get("user"):
+                explanation_prefetcher.schedule(
+                    st.session_state["user"]["id"],
+                    [week_paragraphs[p].get("text", "") for p in para_keys[current_para_idx + 1:]]
+                )
             with st.container():
                 # Display paragraph title as subheading
                 if para.get("title"):
@@ -453,11 +352,7 @@ with col_left:
                 with btn_cols[0]:
                     if st.button("Back", key=back_key, disabled=back_disabled, use_container_width=True):
                         st.session_state[f"current_para_{wk}"] -= 1
-                        # Update progress in Supabase
-                        try:
-                            supabase.table("courses").update({"progress": current_para_idx - 1}).eq("id", course_id).execute()
-                        except Exception as e:
-                            st.error(f"Could not update progress: {e}")
+                        progress_buffer.record(course_id, current_para_idx - 1, wk, duration)
                         st.rerun()
                 with btn_cols[1]:
                     if current_para_idx == len(para_keys) - 1:  # Last paragraph of the week
@@ -467,11 +362,7 @@ with col_left:
                     else:
                         if st.button("Next", key=next_key, disabled=next_disabled, use_container_width=True):
                             st.session_state[f"current_para_{wk}"] += 1
-                            # Update progress in Supabase
-                            try:
-                                supabase.table("courses").update({"progress": current_para_idx + 1}).eq("id", course_id).execute()
-                            except Exception as e:
-                                st.error(f"Could not update progress: {e}")
+                            progress_buffer.record(course_id, current_para_idx + 1, wk, duration)
                             st.rerun()
 
 if not show_congrats:
@@ -491,17 +382,18 @@ if not show_congrats:
             max_week=max_week,
             update_course_final_completion=update_course_final_completion,
             course_dict=course_dict,
-            subject=subject
+            subject=subject,
+            current_progress=int(progress_buffer.current(course_id, row.get("progress") or 0)),
+            tests_completed=int(row.get("completition") or 0),
+            completed=bool(row.get("completed", False))
         )
 
 # Add the explanation dialog at the end of the file
 if st.session_state.get("show_explanation_dialog", False):
     @st.dialog("Paragraph Explanation", width="large")
     def show_explanation_dialog():
-        import time
         from streamlit import session_state as ss
         import re
-        import json
         para_text = ss.get("explanation_para_text", "")
         # Identify the current paragraph uniquely
         course_id = st.session_state.get("current_course_id")
@@ -513,77 +405,28 @@ if st.session_state.get("show_explanation_dialog", False):
         else:
             paragraph_id = "unknown"
         # --- Caching logic ---
+        streamed = False
         if ss.get("explanation_loading", True):
+            # 1. Check Supabase for cached explanation
             with st.spinner("Checking for cached explanation..."):
-                # 1. Check Supabase for cached explanation
+                explanation_prefetcher.wait(para_text)
+                cached = explanation_engine.load(para_text) or explanation_engine.load_legacy(course_id, wk, paragraph_id)
+            if cached:
+                ss["explanation_result"] = cached
+            else:
+                # 2. If not cached, stream it from OpenAI straight into the dialog and save it
                 try:
-                    resp = supabase.table("paragraph_explanations").select("explanation_json").eq("course_id", course_id).eq("week_number", wk).eq("paragraph_id", paragraph_id).maybe_single().execute()
-                    cached = resp.data["explanation_json"] if resp.data and resp.data.get("explanation_json") else None
-                except Exception as e:
-                    cached = None
-                if cached:
+                    text = st.write_stream(explanation_engine.stream(para_text))
+                    ss["explanation_result"] = {"input_text": para_text, "detailed_explanation": text}
+                    streamed = True
                     try:
-                        explanation_json = cached if isinstance(cached, dict) else json.loads(cached)
-                        ss["explanation_result"] = explanation_json
-                        ss["explanation_loading"] = False
-                        st.rerun()
+                        explanation_engine.save(para_text, text)
                     except Exception:
                         pass
-            # 2. If not cached, call OpenAI and save to Supabase
-            with st.spinner("Generating explanation..."):
-                try:
-                    thread = client.beta.threads.create()
-                    msg = client.beta.threads.messages.create(
-                        thread_id=thread.id,
-                        role="user",
-                        content=f"Explain the following paragraph in detail using the provided JSON schema. Paragraph: {para_text}"
-                    )
-                    run = client.beta.threads.runs.create(
-                        thread_id=thread.id,
-                        assistant_id="asst_mer5PvwGviUVWm6yDO7zo3TV",
-                        instructions="Return the explanation in the following JSON schema: {\n  \"name\": \"learning_explanation\",\n  \"schema\": {\n    \"type\": \"object\",\n    \"properties\": {\n      \"input_text\": {\n        \"type\": \"string\",\n        \"description\": \"The input text paragraph that needs to be explained.\"\n      },\n      \"detailed_explanation\": {\n        \"type\": \"string\",\n        \"description\": \"A comprehensive and well-analyzed explanation of the input text, structured between 500 and 700 words, presented in a storytelling format.\"\n      }\n    },\n    \"required\": [\n      \"input_text\",\n      \"detailed_explanation\"\n    ],\n    \"additionalProperties\": false\n  },\n  \"strict\": true\n}"
-                    )
-                    # Wait for completion
-                    while True:
-                        run_status = client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
-                        if run_status.status in ("completed", "failed", "cancelled", "expired"):
-                            break
-                        time.sleep(1)
-                    if run_status.status == "completed":
-                        messages = client.beta.threads.messages.list(thread_id=thread.id)
-                        # Get the latest assistant message
-                        for m in reversed(messages.data):
-                            if m.role == "assistant":
-                                content = m.content[0].text.value if m.content else ""
-                                try:
-                                    match = re.search(r'\{.*\}', content, re.S)
-                                    if match:
-                                        explanation_json = json.loads(match.group(0))
-                                        ss["explanation_result"] = explanation_json
-                                        # Save to Supabase
-                                        try:
-                                            supabase.table("paragraph_explanations").upsert({
-                                                "course_id": course_id,
-                                                "week_number": wk,
-                                                "paragraph_id": paragraph_id,
-                                                "explanation_json": explanation_json
-                                            }).execute()
-                                        except Exception:
-                                            pass
-                                    else:
-                                        ss["explanation_result"] = {"error": "No JSON found in response.", "raw": content}
-                                except Exception as e:
-                                    ss["explanation_result"] = {"error": str(e), "raw": content}
-                                break
-                        else:
-                            ss["explanation_result"] = {"error": "No assistant message found."}
-                    else:
-                        ss["explanation_result"] = {"error": f"Run status: {run_status.status}"}
                 except Exception as e:
                     ss["explanation_result"] = {"error": str(e)}
-                ss["explanation_loading"] = False
-                st.rerun()
-        else:
+            ss["explanation_loading"] = False
+        if not streamed:
             result = ss.get("explanation_result")
             if result is None:
                 st.info("No explanation available.")
@@ -592,13 +435,15 @@ if st.session_state.get("show_explanation_dialog", False):
                 if detailed:
                     formatted = re.sub(r"\n{2,}", "\n\n", detailed)
                     st.markdown(formatted, unsafe_allow_html=True)
+                elif result.get("error"):
+                    st.error(f"Could not generate explanation: {result['error']}")
                 else:
                     st.warning("No detailed explanation found in the response.")
-            if st.button("Close", use_container_width=True):
-                ss["show_explanation_dialog"] = False
-                ss["explanation_loading"] = False
-                ss["explanation_result"] = None
-                ss["explanation_para_text"] = None
+        if st.button("Close", use_container_width=True):
+            ss["show_explanation_dialog"] = False
+            ss["explanation_loading"] = False
+            ss["explanation_result"] = None
+            ss["explanation_para_text"] = None
     show_explanation_dialog()
 
 # Add the project dialog at the end of the file
@@ -619,8 +464,8 @@ if st.session_state.get("show_project_dialog", False):
             with st.spinner("Checking for cached project..."):
                 # 1. Check Supabase for cached project
                 try:
-                    response = supabase.table("courses").select("project").eq("id", course_id).single().execute()
-                    cached = response.data.get("project") if response.data else None
+                    response = supabase.table("courses").select("course_project").eq("id", course_id).single().execute()
+                    cached = response.data.get("course_project") if response.data else None
                     if cached:
                         ss["project_result"] = cached
                         ss["project_loading"] = False
@@ -1,5 +1,9 @@
 import streamlit as st
-from supabase import create_client, Client
+from supabase import Client
+from src.api.client_pool import get_supabase
+from src.utils.profile_loader import profile_loader
+from src.utils.xp_manager import level_progress
+from src.utils.leaderboard import leaderboard
 from login_popup import display_login_popup
 import base64
 from datetime import datetime
@@ -8,13 +12,7 @@ from datetime import datetime
 display_login_popup()  # stores logged‑in user in Session
 
 # ─── Supabase Client ─────────────────────────────────────────────────────
-SUPABASE_URL = "https://fcyutudqmkhrywffsjky.supabase.co"
-SUPABASE_ANON_KEY = (
-    "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9."
-    "eyJpc3MiOiJzdXBhYmFzZSIsInJlZiI6ImZjeXV0dWRxbWtocnl3ZmZzamt5Iiwicm9sZSI6ImFub24iLCJpYXQiOjE3NDI0MjQ3OTAsImV4cCI6MjA1ODAwMDc5MH0."
-    "IucZQwgH1CFYFCgb9E3-TV7I-NOnPq9-3lmrWc4ZE7I"
-)
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+supabase: Client = get_supabase()
 
 # ─── User Info ───────────────────────────────────────────────────────────
 user = st.session_state.get("user")
@@ -23,7 +21,7 @@ if not user:
     st.stop()
 
 user_id = user["id"]
-profile = supabase.table("user_profile").select("*").eq("user_id", user_id).maybe_single().execute().data or {}
+profile = profile_loader.load(user_id)
 
 # Profile picture
 pic_data = profile.get("profile_pic")
@@ -39,15 +37,7 @@ profile_pic = get_pic_uri(pic_data)
 
 # XP/Level calculation
 xp = profile.get("xp", 0) or 0
-level = 1
-xp_needed = 100
-xp_total = 0
-while xp >= xp_total + xp_needed:
-    level += 1
-    xp_total += xp_needed
-    xp_needed += 50
-current_level_xp = xp - xp_total
-progress_percent = current_level_xp / xp_needed if xp_needed else 0
+level, progress_percent, current_level_xp, xp_needed = level_progress(xp)
 
 display_name = profile.get("profile_name") or user.get("email", "Unnamed User")
 bio = profile.get("bio", "")
@@ -188,6 +178,22 @@ with user_col:
         </div>
         """, unsafe_allow_html=True)
 
+    with st.container(border=True):
+        st.markdown("<h4>🥇 Leaderboard</h4>", unsafe_allow_html=True)
+        position = leaderboard.get_position(user_id)
+        if position:
+            st.markdown(
+                f"<div style='margin-bottom:0.5rem;'>Rank <b>#{position['rank']}</b> · "
+                f"ahead of {position['percentile']}% of learners</div>",
+                unsafe_allow_html=True
+            )
+            for row in position["neighbors"]:
+                name = row.get("profile_name") or "Anonymous User"
+                line = f"#{row['rank']} {name} · Level {row['level']} · {row['xp']} XP"
+                st.markdown(f"**{line}**" if row.get("is_target") else line)
+        else:
+            st.info("Earn XP to appear on the leaderboard!")
+
 with stats_col:
     with st.container(border=True):
         st.markdown("<h4>🏆 Achievements</h4>", unsafe_allow_html=True)
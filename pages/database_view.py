@@ -1,6 +1,7 @@
 import streamlit as st
 from dateutil.parser import isoparse
-from supabase import create_client, Client
+from supabase import Client
+from src.api.client_pool import get_supabase
 from login_popup import display_login_popup
 import pathlib
 
@@ -17,13 +18,7 @@ display_login_popup()
 st.title("📚 My Courses")
 
 # ───────────────────  Supabase Client  ───────────────────
-SUPABASE_URL = "https://fcyutudqmkhrywffsjky.supabase.co"
-SUPABASE_ANON_KEY = (
-    "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9."
-    "eyJpc3MiOiJzdXBhYmFzZSIsInJlZiI6ImZjeXV0dWRxbWtocnl3ZmZzamt5Iiwicm9sZSI6ImFub24iLCJpYXQiOjE3NDI0MjQ3OTAsImV4cCI6MjA1ODAwMDc5MH0."
-    "IucZQwgH1CFYFCgb9E3-TV7I-NOnPq9-3lmrWc4ZE7I"
-)
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+supabase: Client = get_supabase()
 
 # ───────────────────  User Validation  ───────────────────
 user_id = st.session_state.get("user", {}).get("id")
@@ -31,16 +26,45 @@ if not user_id:
     st.warning("User not logged in.")
     st.stop()
 
+# ───────────────────  Config  ───────────────────
+PAGE_SIZE = 20  # course cards per request
+CARD_COLUMNS = "id, title, created_at, Public, course_notes_length"
+
+# A fresh visit (or another user) starts the listing over
+if st.session_state.get("nav_page_entered") or st.session_state.get("my_courses_owner") != user_id:
+    st.session_state.my_courses_owner = user_id
+    st.session_state.my_courses = []
+    st.session_state.my_courses_cursor = None
+    st.session_state.my_courses_has_more = True
+
 # ───────────────────  Fetch User Courses  ───────────────────
-courses = (
-    supabase.table("courses")
-    .select("*")
-    .order("created_at", desc=True)
-    .execute()
-    .data
-    or []
-)
-courses = [c for c in courses if c.get("user_id") == user_id]
+def fetch_next_page(page_size: int = PAGE_SIZE) -> None:
+    """Load the next page of this user's course cards using a (created_at, id) keyset cursor."""
+    query = (
+        supabase.table("courses")
+        .select(CARD_COLUMNS)
+        .eq("user_id", user_id)
+        .order("created_at", desc=True)
+        .order("id", desc=True)
+        .limit(page_size + 1)  # one extra row tells us whether another page exists
+    )
+    cursor = st.session_state.my_courses_cursor
+    if cursor:
+        created_at, last_id = cursor
+        query = query.or_(
+            f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{last_id})'
+        )
+
+    rows = query.execute().data or []
+    page = rows[:page_size]
+    st.session_state.my_courses.extend(page)
+    st.session_state.my_courses_has_more = len(rows) > page_size
+    if page:
+        st.session_state.my_courses_cursor = (page[-1]["created_at"], page[-1]["id"])
+
+if not st.session_state.my_courses and st.session_state.my_courses_has_more:
+    fetch_next_page()
+courses = st.session_state.my_courses
 
 st.subheader("Your Courses")
 if not courses:
@@ -48,15 +72,23 @@ if not courses:
     st.stop()
 
 # ───────────────────  Helper dialogs  ───────────────────
-def open_dialog(course_id: str, title: str, action: str, existing_notes: str = ""):
+def open_dialog(course_id: str, title: str, action: str):
     @st.dialog(f'{action} for "{title}"')
     def _dlg():
         if action == "Notes":
+            # Notes are not part of the card payload; load them when the dialog opens
+            existing_notes = (
+                supabase.table("courses").select("course_notes").eq("id", course_id).single().execute().data
+                or {}
+            ).get("course_notes") or ""
             txt = st.text_area("Course notes:", value=existing_notes, height=400, key=f"notes-area-{course_id}")
             if st.button("save", key=f"btn-black-save-notes-{course_id}"):  # ← Material icon
                 supabase.table("courses").update(
                     {"course_notes": txt}
                 ).eq("id", course_id).execute()
+                for c in st.session_state.my_courses:
+                    if c["id"] == course_id:
+                        c["course_notes_length"] = len(txt)
                 st.success("Notes saved. Close dialog when done.")
     _dlg()
 
@@ -74,12 +106,15 @@ for course in courses:
 
         info.markdown(f"### {title}", unsafe_allow_html=True)
         info.markdown(f"🕒 **Created:** {created}", unsafe_allow_html=True)
+        if course.get("course_notes_length"):
+            info.caption(f"📝 {course['course_notes_length']} characters of notes")
 
         # public toggle
         now_pub = bool(course.get("Public", False))
         new_pub = pub_col.toggle("public", value=now_pub, key=f"pub-toggle-{cid}", help="Public?")
         if new_pub != now_pub:
             supabase.table("courses").update({"Public": new_pub}).eq("id", cid).execute()
+            course["Public"] = new_pub
             st.rerun()
 
         # pills replacing buttons
@@ -100,4 +135,10 @@ for course in courses:
             st.switch_page("pages/course_view.py")
 
         elif selected_action == 1:
-            open_dialog(cid, title, "Notes", course.get("course_notes", ""))
+            open_dialog(cid, title, "Notes")
+
+# ───────────────────  Lazy Loading  ───────────────────
+if st.session_state.my_courses_has_more:
+    if st.button("Load more…", key="btn-black-load-more", use_container_width=True):
+        fetch_next_page()
+        st.rerun()
@@ -1,18 +1,13 @@
 import streamlit as st
-from supabase import create_client, Client
+from supabase import Client
+from src.api.client_pool import get_supabase
+from src.utils.profile_loader import load_authors
 from login_popup import display_login_popup
-import base64
 from datetime import datetime
 import time
 
 # Initialize Supabase client
-SUPABASE_URL = "https://fcyutudqmkhrywffsjky.supabase.co"
-SUPABASE_ANON_KEY = (
-    "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9."
-    "eyJpc3MiOiJzdXBhYmFzZSIsInJlZiI6ImZjeXV0dWRxbWtocnl3ZmZzamt5Iiwicm9sZSI6ImFub24iLCJpYXQiOjE3NDI0MjQ3OTAsImV4cCI6MjA1ODAwMDc5MH0."
-    "IucZQwgH1CFYFCgb9E3-TV7I-NOnPq9-3lmrWc4ZE7I"
-)
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+supabase: Client = get_supabase()
 
 # Display login popup
 display_login_popup()
@@ -26,6 +21,8 @@ if not user:
 # Initialize session state
 if "current_page" not in st.session_state:
     st.session_state.current_page = 1
+if "thread_cursors" not in st.session_state:
+    st.session_state.thread_cursors = [None]
 if "sort_by" not in st.session_state:
     st.session_state.sort_by = "newest"
 if "search_query" not in st.session_state:
@@ -35,25 +32,19 @@ if "selected_category" not in st.session_state:
 
 # Constants
 THREADS_PER_PAGE = 10
+# How the pager learns the number of pages: "exact" or "estimated" ask PostgREST
+# to count the filtered listing in the same request; None switches to cursor
+# paging ("Next" while more rows exist) that never counts at all.
+COUNT_MODE = "estimated"
+SORT_COLUMNS = {"newest": "created_at", "most_liked": "likes", "most_commented": "comments"}
 CATEGORIES = ["All", "Announcements", "General Discussion", "Help & Support", "Feedback & Suggestions", "Introductions", "Off-Topic / Lounge", "Bug Reports"]
 
-# Helper functions
-def get_user_avatar(user_id):
-    try:
-        profile = supabase.table("user_profile").select("profile_pic").eq("user_id", user_id).single().execute()
-        pic_data = profile.data.get("profile_pic")
-        if isinstance(pic_data, str) and pic_data.startswith("\\x"):
-            return f"data:image/png;base64,{base64.b64encode(bytes.fromhex(pic_data[2:])).decode()}"
-    except Exception:
-        pass
-    return "https://via.placeholder.com/40"
+DEFAULT_AVATAR = "https://via.placeholder.com/40"
 
-def get_user_name(user_id):
-    try:
-        profile = supabase.table("user_profile").select("profile_name").eq("user_id", user_id).single().execute()
-        return profile.data.get("profile_name", "Anonymous User")
-    except Exception:
-        return "Anonymous User"
+# Helper functions
+def reset_paging():
+    st.session_state.current_page = 1
+    st.session_state.thread_cursors = [None]
 
 def format_timestamp(timestamp):
     try:
@@ -68,10 +59,10 @@ st.title("💬 Forum")
 # Search and filter bar
 col1, col2, col3 = st.columns([2, 2, 1])
 with col1:
-    search_query = st.text_input("🔍 Search threads", value=st.session_state.search_query)
+    search_query = st.text_input("🔍 Search threads and comments", value=st.session_state.search_query)
     if search_query != st.session_state.search_query:
         st.session_state.search_query = search_query
-        st.session_state.current_page = 1
+        reset_paging()
         st.rerun()
 
 with col2:
@@ -82,14 +73,14 @@ with col2:
     )
     if sort_by != st.session_state.sort_by:
         st.session_state.sort_by = sort_by
-        st.session_state.current_page = 1
+        reset_paging()
         st.rerun()
 
 with col3:
     category = st.selectbox("Category", CATEGORIES, index=CATEGORIES.index(st.session_state.selected_category))
     if category != st.session_state.selected_category:
         st.session_state.selected_category = category
-        st.session_state.current_page = 1
+        reset_paging()
         st.rerun()
 
 # Create new thread button
@@ -130,44 +121,70 @@ if st.session_state.get("show_new_thread", False):
 
 # Fetch and display threads
 try:
-    query = supabase.table("forum_threads").select("*")
-    
-    # Apply category filter
-    if st.session_state.selected_category != "All":
-        query = query.eq("category", st.session_state.selected_category)
-    
-    # Apply search filter
     if st.session_state.search_query:
-        query = query.ilike("title", f"%{st.session_state.search_query}%")
-    
-    # Apply sorting
-    if st.session_state.sort_by == "newest":
-        query = query.order("created_at", desc=True)
-    elif st.session_state.sort_by == "most_liked":
-        query = query.order("likes", desc=True)
-    elif st.session_state.sort_by == "most_commented":
-        query = query.order("comments", desc=True)
-    
-    # Apply pagination
-    start = (st.session_state.current_page - 1) * THREADS_PER_PAGE
-    end = start + THREADS_PER_PAGE - 1
-    query = query.range(start, end)
+        # Full-text search: ranked by relevance over title, body and comments
+        response = supabase.rpc("search_forum_threads", {
+            "search_query": st.session_state.search_query,
+            "category_filter": None if st.session_state.selected_category == "All" else st.session_state.selected_category,
+            "page_size": THREADS_PER_PAGE,
+            "page_offset": (st.session_state.current_page - 1) * THREADS_PER_PAGE,
+        }).execute()
+        threads = response.data or []
+        total_threads = threads[0]["total_count"] if threads else 0
+        total_pages = max(1, (total_threads + THREADS_PER_PAGE - 1) // THREADS_PER_PAGE)
+        has_next = st.session_state.current_page < total_pages
+        sort_column = None
+        st.caption(f"{total_threads} results, most relevant first")
+    else:
+        query = supabase.table("forum_threads").select("*", count=COUNT_MODE)
+        
+        # Apply category filter
+        if st.session_state.selected_category != "All":
+            query = query.eq("category", st.session_state.selected_category)
+        
+        # Apply sorting (id breaks ties so pages never overlap)
+        sort_column = SORT_COLUMNS[st.session_state.sort_by]
+        query = query.order(sort_column, desc=True).order("id", desc=True)
+        
+        # Apply pagination
+        if COUNT_MODE:
+            start = (st.session_state.current_page - 1) * THREADS_PER_PAGE
+            end = start + THREADS_PER_PAGE - 1
+            query = query.range(start, end)
+        else:
+            # Keyset cursor: continue after the last (sort value, id) of the previous page
+            cursor = st.session_state.thread_cursors[st.session_state.current_page - 1]
+            if cursor:
+                value, last_id = cursor
+                query = query.or_(f'{sort_column}.lt."{value}",and({sort_column}.eq."{value}",id.lt.{last_id})')
+            query = query.limit(THREADS_PER_PAGE + 1)
+        
+        response = query.execute()
+        threads = response.data[:THREADS_PER_PAGE]
+        if COUNT_MODE:
+            total_pages = max(1, ((response.count or 0) + THREADS_PER_PAGE - 1) // THREADS_PER_PAGE)
+            has_next = st.session_state.current_page < total_pages
+        else:
+            total_pages = None
+            has_next = len(response.data) > THREADS_PER_PAGE
     
-    threads = query.execute().data
+    # Hydrate all authors on this page with one user_profile query
+    authors = load_authors([t["user_id"] for t in threads], DEFAULT_AVATAR)
     
     # Display threads
     for thread in threads:
+        author = authors.get(thread["user_id"], {"name": "Anonymous User", "avatar": DEFAULT_AVATAR})
         with st.container(border=True):
             col1, col2 = st.columns([1, 5])
             
             with col1:
-                st.image(get_user_avatar(thread["user_id"]), width=40)
+                st.image(author["avatar"], width=40)
             
             with col2:
                 st.markdown(f"### {thread['title']}")
-                st.markdown(f"Posted by {get_user_name(thread['user_id'])} • {format_timestamp(thread['created_at'])}")
+                st.markdown(f"Posted by {author['name']} • {format_timestamp(thread['created_at'])}")
                 st.markdown(f"Category: {thread['category']}")
-                st.markdown(thread['content'])
+                st.markdown(thread.get("headline") or thread['content'])
                 
                 # Thread actions
                 col3, col4, col5 = st.columns([1, 1, 1])
@@ -199,20 +216,24 @@ try:
                         st.rerun()
     
     # Pagination
-    total_threads = len(supabase.table("forum_threads").select("id").execute().data)
-    total_pages = (total_threads + THREADS_PER_PAGE - 1) // THREADS_PER_PAGE
-    
-    if total_pages > 1:
+    if has_next or st.session_state.current_page > 1:
         col1, col2, col3 = st.columns([1, 2, 1])
         with col2:
-            st.markdown(f"Page {st.session_state.current_page} of {total_pages}")
+            if total_pages:
+                st.markdown(f"Page {st.session_state.current_page} of {total_pages}")
+            else:
+                st.markdown(f"Page {st.session_state.current_page}")
             prev, next = st.columns(2)
             with prev:
                 if st.button("Previous", disabled=st.session_state.current_page == 1):
                     st.session_state.current_page -= 1
+                    del st.session_state.thread_cursors[st.session_state.current_page:]
                     st.rerun()
             with next:
-                if st.button("Next", disabled=st.session_state.current_page == total_pages):
+                if st.button("Next", disabled=not has_next):
+                    last = threads[-1]
+                    del st.session_state.thread_cursors[st.session_state.current_page:]
+                    st.session_state.thread_cursors.append((last[sort_column], last["id"]) if sort_column else None)
                     st.session_state.current_page += 1
                     st.rerun()
 
@@ -227,8 +248,12 @@ if st.session_state.get("selected_thread"):
         thread = supabase.table("forum_threads").select("*").eq("id", thread_id).single().execute().data
         
         if thread:
+            comments = supabase.table("forum_comments").select("*").eq("thread_id", thread_id).order("created_at", desc=True).execute().data
+            # Thread author and all commenters in one user_profile query
+            authors = load_authors([thread["user_id"]] + [c["user_id"] for c in comments], DEFAULT_AVATAR)
+            
             st.markdown(f"### {thread['title']}")
-            st.markdown(f"Posted by {get_user_name(thread['user_id'])} • {format_timestamp(thread['created_at'])}")
+            st.markdown(f"Posted by {authors[thread['user_id']]['name']} • {format_timestamp(thread['created_at'])}")
             st.markdown(f"Category: {thread['category']}")
             st.markdown(thread['content'])
             
@@ -259,15 +284,14 @@ if st.session_state.get("selected_thread"):
                             st.error(f"Failed to post comment: {e}")
             
             # Display comments
-            comments = supabase.table("forum_comments").select("*").eq("thread_id", thread_id).order("created_at", desc=True).execute().data
-            
             for comment in comments:
+                author = authors[comment["user_id"]]
                 with st.container(border=True):
                     col1, col2 = st.columns([1, 5])
                     with col1:
-                        st.image(get_user_avatar(comment["user_id"]), width=40)
+                        st.image(author["avatar"], width=40)
                     with col2:
-                        st.markdown(f"**{get_user_name(comment['user_id'])}** • {format_timestamp(comment['created_at'])}")
+                        st.markdown(f"**{author['name']}** • {format_timestamp(comment['created_at'])}")
                         st.markdown(comment["content"])
         
         if st.button("Close"):
@@ -1,24 +1,19 @@
 import streamlit as st
-from supabase import create_client, Client
+from supabase import Client
+from src.api.client_pool import get_supabase
 from postgrest.exceptions import APIError
 import base64
 from login_popup import display_login_popup
 import pathlib
-from src.utils.xp_manager import xp_manager
+from src.utils.search import search
+from src.api.explanation_warmup import enqueue_explanation_warmup
 
 # ─── Streamlit bootstrap ─────────────────────────────────────────────────
 display_login_popup()                      # stores logged‑in user in Session
 
 
 # ───────────────────  Supabase  ───────────────────
-SUPABASE_URL = "https://fcyutudqmkhrywffsjky.supabase.co"
-SUPABASE_ANON_KEY = (
-    "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9."
-    "eyJpc3MiOiJzdXBhYmFzZSIsInJlZiI6ImZjeXV0dWRxbWtocnl3ZmZzamt5Iiwicm9sZSI6ImFub24iLCJpYXQiOjE3NDI0MjQ3OTAsImV4cCI6MjA1ODAwMDc5MH0."
-    "IucZQwgH1CFYFCgb9E3-TV7I-NOnPq9-3lmrWc4ZE7I"
-)
-
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+supabase: Client = get_supabase()
 
 # ───────────────────  Config  ───────────────────
 PAGE_SIZE = 8  # fetch 8 public courses per request
@@ -60,58 +55,45 @@ if st.session_state.offset == 0:
 
 st.title("🌐 Public Courses")
 
+# ───────────────────  Search  ───────────────────
+# Local FTS index over public courses, refreshed incrementally in the background
+search.sync_if_stale()
+# Pre-explain the most popular courses once a day so every copy gets cache hits
+if st.session_state.get("nav_page_entered"):
+    enqueue_explanation_warmup()
+search_query = st.text_input("🔍 Search public courses", key="library_search")
+if search_query:
+    results = search.search(search_query, limit=20)
+    visible_courses = [
+        {"id": r["course_id"], "title": r["title"], "excerpt": r["excerpt"]}
+        for r in results
+    ]
+    if not visible_courses:
+        st.info("No public courses match your search.")
+else:
+    visible_courses = st.session_state.courses
+
 # ───────────────────  UI  ───────────────────
 cols = st.columns(4, gap="large", vertical_alignment="top")
-for idx, course in enumerate(st.session_state.courses):
+for idx, course in enumerate(visible_courses):
     with cols[idx % 4]:
         with st.container(border=True):
             st.markdown(f"<h4 style='margin:0'>{course.get('title', 'Untitled')}</h4>", unsafe_allow_html=True)
+            if course.get("excerpt"):
+                st.markdown(f"<small>{course['excerpt']}</small>", unsafe_allow_html=True)
 
             st.feedback("stars", key=f"rating-{course['id']}")
 
             if st.button("Save", key=f"btn-black-save-{course['id']}"):
                 try:
-                    # Get the original course data
-                    original_course = supabase.table("courses").select("*").eq("id", course["id"]).single().execute().data
-                    
-                    # Create a new course entry with specific fields
-                    new_course_data = {
-                        # Course parameters
-                        "title": original_course["title"],
-                        "course_topic": original_course["course_topic"],
-                        "course_length": original_course["course_length"],
-                        "skill_level": original_course["skill_level"],
-                        "resource_type": original_course["resource_type"],
-                        "emphasis": original_course["emphasis"],
-                        "knowledge": original_course["knowledge"],
-                        "learning_curve": original_course["learning_curve"],
-                        
-                        # Content and creator info
-                        "content": original_course["content"],
-                        "creators_id": original_course["creators_id"],
-                        "project": original_course.get("project"),
-                        
-                        # New user and reset fields
-                        "user_id": st.session_state["user"]["id"],
-                        "progress": 0,
-                        "checked": False,
-                        "completed": False,
-                        "completition": 0,
-                        "course_notes": ""
-                    }
-                    
-                    # Insert the new course
-                    response = supabase.table("courses").insert(new_course_data).execute()
-                    
-                    # Add XP reward to the course creator
-                    creator_id = original_course["creators_id"]
-                    xp_manager.reward_course_saved(creator_id)
-                    
+                    # Copy only per-user state; content and project stay in a shared blob
+                    # (the RPC also rewards the course creator)
+                    supabase.rpc("save_course_copy", {"source_course_id": course["id"]}).execute()
                     st.success("Course saved!")
                 except Exception as e:
                     st.error(f"Failed to save course: {e}")
 
 # ───────────────────  Lazy Loading  ───────────────────
-if st.button("Load more…", key="btn-black-load-more", use_container_width=True):
+if not search_query and st.button("Load more…", key="btn-black-load-more", use_container_width=True):
     fetch_next_batch()
     st.rerun()
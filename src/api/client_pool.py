@@ -0,0 +1,169 @@
+import threading
+import time
+from typing import Any, Dict, Optional
+import httpx
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from supabase import create_client, Client, ClientOptions
+
+# Default project credentials (overridden by st.secrets["supabase"] when present)
+SUPABASE_URL = "https://fcyutudqmkhrywffsjky.supabase.co"
+SUPABASE_ANON_KEY = (
+    "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9."
+    "eyJpc3MiOiJzdXBhYmFzZSIsInJlZiI6ImZjeXV0dWRxbWtocnl3ZmZzamt5Iiwicm9sZSI6ImFub24iLCJpYXQiOjE3NDI0MjQ3OTAsImV4cCI6MjA1ODAwMDc5MH0."
+    "IucZQwgH1CFYFCgb9E3-TV7I-NOnPq9-3lmrWc4ZE7I"
+)
+
+SESSION_CLIENT_KEY = "_supabase_client"
+
+
+def _credentials() -> tuple[str, str]:
+    try:
+        return st.secrets["supabase"]["url"], st.secrets["supabase"]["anon_key"]
+    except Exception:
+        return SUPABASE_URL, SUPABASE_ANON_KEY
+
+
+def _service_key() -> Optional[str]:
+    """Service-role key for trusted backend writes; never shipped with the repo"""
+    try:
+        return st.secrets["supabase"]["service_key"]
+    except Exception:
+        return None
+
+
+class SupabaseClientPool:
+    """Process-wide factory that hands out Supabase clients sharing one keep-alive connection pool.
+
+    Every Streamlit session gets its own ``Client`` (and therefore its own auth
+    state and headers), but all of them send requests through the same
+    ``httpx.HTTPTransport``, so TCP/TLS connections are reused across reruns,
+    pages and users instead of being re-established on every click.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 50,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 120.0,
+        timeout: float = 30.0,
+    ):
+        self.url, self.key = _credentials()
+        self.timeout = timeout
+        self._transport = httpx.HTTPTransport(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            retries=1,
+        )
+        self._lock = threading.Lock()
+        self._client_lock = threading.Lock()
+        self._shared_client: Optional[Client] = None
+        self._service_client: Optional[Client] = None
+        self._connect_started: Dict[int, float] = {}
+        self._stats = {
+            "clients_created": 0,
+            "requests": 0,
+            "connections_opened": 0,
+            "handshake_seconds_total": 0.0,
+        }
+
+    # ─── instrumentation ────────────────────────────────────────────────
+    def _trace(self, event_name: str, info: Dict[str, Any]) -> None:
+        """httpcore trace hook: times TCP connect + TLS handshake for new connections"""
+        thread_id = threading.get_ident()
+        if event_name == "connection.connect_tcp.started":
+            self._connect_started[thread_id] = time.perf_counter()
+        elif event_name in ("connection.start_tls.complete", "connection.start_tls.failed"):
+            started = self._connect_started.pop(thread_id, None)
+            if started is not None:
+                with self._lock:
+                    self._stats["connections_opened"] += 1
+                    self._stats["handshake_seconds_total"] += time.perf_counter() - started
+
+    def _on_request(self, request: httpx.Request) -> None:
+        request.extensions["trace"] = self._trace
+        with self._lock:
+            self._stats["requests"] += 1
+
+    def _http_client(self) -> httpx.Client:
+        # A thin per-client wrapper: headers (incl. Authorization) stay per session,
+        # while the transport - and with it the connection pool - is shared.
+        return httpx.Client(
+            transport=self._transport,
+            timeout=self.timeout,
+            follow_redirects=True,
+            event_hooks={"request": [self._on_request]},
+        )
+
+    # ─── client factory ─────────────────────────────────────────────────
+    def create_client(self, key: Optional[str] = None) -> Client:
+        """Create a new Supabase client that routes through the shared connection pool"""
+        try:
+            options = ClientOptions(httpx_client=self._http_client())
+        except TypeError:  # supabase-py without httpx_client support
+            options = ClientOptions()
+        with self._lock:
+            self._stats["clients_created"] += 1
+        return create_client(self.url, key or self.key, options=options)
+
+    def shared_client(self) -> Client:
+        """Process-wide client for work that runs outside a user session (background threads)"""
+        if self._shared_client is None:
+            with self._client_lock:
+                if self._shared_client is None:
+                    self._shared_client = self.create_client()
+        return self._shared_client
+
+    def service_client(self) -> Optional[Client]:
+        """Process-wide service-role client for trusted background writes (None if not configured)"""
+        if self._service_client is None:
+            key = _service_key()
+            if not key:
+                return None
+            with self._client_lock:
+                if self._service_client is None:
+                    self._service_client = self.create_client(key)
+        return self._service_client
+
+    def get_client(self) -> Client:
+        """Return the current session's client, creating it on the session's first run"""
+        if get_script_run_ctx() is None:
+            return self.shared_client()
+        client = st.session_state.get(SESSION_CLIENT_KEY)
+        if client is None:
+            client = self.create_client()
+            st.session_state[SESSION_CLIENT_KEY] = client
+        return client
+
+    def stats(self) -> Dict[str, Any]:
+        """Connection pool statistics: open connections, reuse ratio and handshake time"""
+        pool = getattr(self._transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        with self._lock:
+            stats = dict(self._stats)
+        requests = stats["requests"]
+        opened = stats["connections_opened"]
+        stats.update({
+            "open_connections": sum(1 for c in connections if not c.is_closed()),
+            "idle_connections": sum(1 for c in connections if c.is_idle()),
+            "reuse_ratio": (1 - opened / requests) if requests else 0.0,
+            "avg_handshake_ms": (stats["handshake_seconds_total"] / opened * 1000) if opened else 0.0,
+        })
+        return stats
+
+
+# Initialize global client pool
+pool = SupabaseClientPool()
+
+
+def get_supabase() -> Client:
+    """Supabase client for the current session, backed by the shared connection pool"""
+    return pool.get_client()
+
+
+def get_service_supabase() -> Optional[Client]:
+    """Service-role client for trusted backend work, or None when no service key is configured"""
+    return pool.service_client()
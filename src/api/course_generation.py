@@ -0,0 +1,46 @@
+import hashlib
+import json
+import time
+from typing import Any, Dict
+import requests
+from urllib3.exceptions import NewConnectionError
+from ..utils.background_tasks import persistent_queue
+
+COURSE_WEBHOOK_URL = "https://hook.eu2.make.com/wpt0ou5l5u8merimwvdqr5t67ul7e6f5"
+
+class WebhookNotReached(Exception):
+    """The request never reached the webhook, so retrying cannot create a duplicate course"""
+
+
+@persistent_queue.register("generate_course", retry_on=(WebhookNotReached,))
+def generate_course_task(**payload: Any) -> int:
+    """Durable handler: ask the generation webhook for a course and return its id.
+
+    The webhook is not idempotent, so only failures to connect are retried;
+    read timeouts and error responses fail the task.
+    """
+    try:
+        response = requests.post(COURSE_WEBHOOK_URL, json=payload, timeout=(10, 600))
+    except requests.exceptions.ConnectTimeout as e:
+        raise WebhookNotReached(str(e)) from e
+    except requests.exceptions.ConnectionError as e:
+        # Refused / DNS failures happen before the request is sent
+        if isinstance(getattr(e.args[0], "reason", None), NewConnectionError) if e.args else False:
+            raise WebhookNotReached(str(e)) from e
+        raise
+    if response.status_code != 200:
+        raise RuntimeError(f"Course generation failed with status {response.status_code}")
+    course_id = response.text.strip()
+    if not course_id.isdigit():
+        raise ValueError("Invalid course ID received from server.")
+    return int(course_id)
+
+
+def enqueue_course_generation(payload: Dict[str, Any], dedupe_seconds: int = 600) -> int:
+    """Queue a course generation; identical requests within dedupe_seconds share one task"""
+    digest = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+    digest = f"{digest}:{int(time.time() // dedupe_seconds)}"
+    return persistent_queue.enqueue("generate_course", payload, idempotency_key=f"generate_course:{digest}")
+
+
+persistent_queue.start()
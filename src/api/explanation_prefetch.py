@@ -0,0 +1,160 @@
+from typing import Any, Dict, Iterable, Optional, Tuple
+from queue import Full
+import threading
+import time
+from supabase import Client
+from .client_pool import get_supabase
+from .explanations import content_hash, explanation_engine
+from ..utils.background_tasks import task_manager, LANE_PREFETCH
+
+# gpt-4o-mini list prices in USD per 1K tokens, used to budget prefetches
+INPUT_COST_PER_1K = 0.00015
+OUTPUT_COST_PER_1K = 0.0006
+
+
+def estimate_cost(paragraph_text: str, max_tokens: int = explanation_engine.max_tokens) -> float:
+    """Upper-bound cost of one explanation (about 4 characters per token)"""
+    prompt_tokens = (len(paragraph_text) + 400) / 4
+    return prompt_tokens / 1000 * INPUT_COST_PER_1K + max_tokens / 1000 * OUTPUT_COST_PER_1K
+
+
+class ExplanationPrefetcher:
+    """Generates explanations for the paragraphs a user is about to read.
+
+    ``schedule`` is called on every rerun with the next few paragraphs and
+    submits each missing explanation to the prefetch lane of the background
+    task manager. Work is keyed by the paragraph's content hash, so copies of
+    a course never prefetch the same text twice. Prefetching is best effort:
+    a paragraph is skipped when the user already has ``per_user_limit``
+    prefetches in flight, when ``global_limit`` are in flight process-wide,
+    or when its estimated cost would exceed the user's or the global daily
+    budget. The global budget also covers the explanation warm-up. ``wait`` lets the Explain dialog pick up an in-flight prefetch
+    instead of generating the same explanation twice.
+    """
+
+    def __init__(
+        self,
+        lookahead: int = 2,
+        per_user_limit: int = 1,
+        global_limit: int = 4,
+        daily_budget: float = 5.0,
+        user_daily_budget: float = 0.25,
+    ):
+        self.lookahead = lookahead
+        self.per_user_limit = per_user_limit
+        self.global_limit = global_limit
+        self.daily_budget = daily_budget
+        self.user_daily_budget = user_daily_budget
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Tuple[str, threading.Event]] = {}
+        self._done: set = set()
+        self._day = ""
+        self._spent = 0.0
+        self._user_spent: Dict[str, float] = {}
+        self.stats = {"scheduled": 0, "generated": 0, "already_cached": 0, "failed": 0, "skipped_limit": 0, "skipped_budget": 0}
+
+    def _roll_day(self) -> None:
+        day = time.strftime("%Y-%m-%d", time.gmtime())
+        if day != self._day:
+            self._day, self._spent, self._user_spent, self._done = day, 0.0, {}, set()
+
+    def _reserve(self, key: str, user_id: str, cost: float) -> Optional[threading.Event]:
+        with self._lock:
+            if key in self._done or key in self._inflight:
+                return None
+            running = [owner for owner, _ in self._inflight.values()]
+            if len(running) >= self.global_limit or running.count(user_id) >= self.per_user_limit:
+                self.stats["skipped_limit"] += 1
+                return None
+            self._roll_day()
+            user_spent = self._user_spent.get(user_id, 0.0)
+            if self._spent + cost > self.daily_budget or user_spent + cost > self.user_daily_budget:
+                self.stats["skipped_budget"] += 1
+                return None
+            self._spent += cost
+            self._user_spent[user_id] = user_spent + cost
+            done = threading.Event()
+            self._inflight[key] = (user_id, done)
+            self.stats["scheduled"] += 1
+            return done
+
+    def charge(self, cost: float) -> bool:
+        """Take ``cost`` from the global daily budget for explanations generated
+        outside prefetching (the warm-up worker); False if it does not fit"""
+        with self._lock:
+            self._roll_day()
+            if self._spent + cost > self.daily_budget:
+                self.stats["skipped_budget"] += 1
+                return False
+            self._spent += cost
+            return True
+
+    def _release(
+        self, key: str, user_id: str, outcome: str,
+        refund: float = 0.0, done: bool = True
+    ) -> None:
+        with self._lock:
+            self.stats[outcome] += 1
+            _, event = self._inflight.pop(key, (None, None))
+            if done:
+                self._done.add(key)
+            if refund and self._day == time.strftime("%Y-%m-%d", time.gmtime()):
+                self._spent -= refund
+                self._user_spent[user_id] = self._user_spent.get(user_id, 0.0) - refund
+        if event is not None:
+            event.set()
+
+    def _prefetch(self, key: str, user_id: str, paragraph_text: str, cost: float, client: Client) -> None:
+        try:
+            cached = explanation_engine.load(paragraph_text, client=client)
+        except Exception:
+            # Nothing was spent yet: refund and allow a later attempt
+            self._release(key, user_id, "failed", refund=cost, done=False)
+            raise
+        if cached:
+            self._release(key, user_id, "already_cached", refund=cost)
+            return
+        try:
+            explanation_engine.generate(paragraph_text, client=client)
+        except Exception:
+            # The model may already have been paid for (e.g. only the save
+            # failed): keep the charge and do not prefetch this text again today
+            self._release(key, user_id, "failed")
+            raise
+        self._release(key, user_id, "generated")
+
+    def schedule(self, user_id: str, upcoming: Iterable[str]) -> None:
+        """Prefetch explanations for the next ``lookahead`` paragraph texts"""
+        client = get_supabase()
+        for paragraph_text in list(upcoming)[:self.lookahead]:
+            if not paragraph_text:
+                continue
+            key = content_hash(paragraph_text)
+            cost = estimate_cost(paragraph_text)
+            if self._reserve(key, user_id, cost) is None:
+                continue
+            try:
+                task_manager.submit_task(
+                    f"explain:{key}",
+                    self._prefetch, key, user_id, paragraph_text, cost, client,
+                    lane=LANE_PREFETCH, timeout=0
+                )
+            except Full:
+                self._release(key, user_id, "skipped_limit", refund=cost, done=False)
+
+    def wait(self, paragraph_text: str, timeout: float = 60) -> bool:
+        """Block until an in-flight prefetch of this paragraph finishes; False if none is running"""
+        with self._lock:
+            entry = self._inflight.get(content_hash(paragraph_text))
+        if entry is None:
+            return False
+        return entry[1].wait(timeout)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters plus today's spend, for diagnostics"""
+        with self._lock:
+            self._roll_day()
+            return {**self.stats, "in_flight": len(self._inflight), "spent_today": round(self._spent, 4)}
+
+# Initialize global explanation prefetcher instance
+explanation_prefetcher = ExplanationPrefetcher()
@@ -0,0 +1,105 @@
+import time
+from typing import List, Optional
+from .client_pool import get_service_supabase
+from .explanations import content_hash, explanation_engine, normalize_paragraph
+from .explanation_prefetch import estimate_cost, explanation_prefetcher
+from ..utils.background_tasks import persistent_queue
+from ..utils.course_model import get_course_model, model_source
+
+WARMUP_TOP_N = 20
+
+
+def _today() -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime())
+
+
+def _paragraph_texts(course_dict: dict) -> List[str]:
+    """Distinct normalized paragraph texts of a course, in reading order"""
+    texts = {}
+    for week in course_dict.values():
+        for para in week.get("paragraphs", {}).values():
+            text = normalize_paragraph(para.get("text", ""))
+            if text:
+                texts.setdefault(text, None)
+    return list(texts)
+
+
+@persistent_queue.register("warm_public_explanations")
+def warm_public_explanations_task(top_n: int = WARMUP_TOP_N) -> int:
+    """Durable handler: queue one warm-up task per top-rated public course"""
+    client = get_service_supabase()
+    if client is None:
+        return 0
+    rows = (
+        client.table("courses")
+        .select("id")
+        .eq("public", True)
+        .order("rating", desc=True, nullsfirst=False)
+        .limit(top_n)
+        .execute()
+        .data
+    ) or []
+    for row in rows:
+        persistent_queue.enqueue(
+            "warm_course_explanations",
+            {"course_id": row["id"]},
+            idempotency_key=f"warm_course_explanations:{row['id']}:{_today()}"
+        )
+    return len(rows)
+
+
+@persistent_queue.register("warm_course_explanations")
+def warm_course_explanations_task(course_id: str, budget: float = 0.25) -> int:
+    """Durable handler: explain every paragraph of a course that has no cached explanation.
+
+    Stops once the estimated spend would exceed ``budget`` (USD) or the
+    prefetcher's global daily budget, which this spend counts against; a
+    retry or the next day's run continues where it left off. Explanations
+    are stored with the service-role client, the only writer allowed to
+    replace cached rows. Returns the number of explanations generated.
+    """
+    client = get_service_supabase()
+    if client is None:
+        return 0
+    row = client.table("courses").select("id, updated_at, blob_hash").eq("id", course_id).single().execute().data
+    if not row:
+        return 0
+
+    def load_content():
+        data = client.table("courses").select("course_content").eq("id", course_id).single().execute().data
+        return data.get("course_content") if data else None
+
+    model = get_course_model(*model_source(course_id, row), load_content)
+    if not model:
+        return 0
+
+    texts = _paragraph_texts(model["course_dict"])
+    cached = explanation_engine.cached_hashes((content_hash(text) for text in texts), client=client)
+    spent, generated = 0.0, 0
+    for text in texts:
+        if content_hash(text) in cached:
+            continue
+        cost = estimate_cost(text)
+        if spent + cost > budget or not explanation_prefetcher.charge(cost):
+            break
+        explanation_engine.generate(text, client=client)
+        spent += cost
+        generated += 1
+    return generated
+
+
+def enqueue_explanation_warmup(top_n: int = WARMUP_TOP_N) -> Optional[int]:
+    """Queue the warm-up of the top-N public courses; one run per day however often it is called.
+
+    Does nothing unless a service-role key is configured.
+    """
+    if get_service_supabase() is None:
+        return None
+    return persistent_queue.enqueue(
+        "warm_public_explanations",
+        {"top_n": top_n},
+        idempotency_key=f"warm_public_explanations:{_today()}"
+    )
+
+
+persistent_queue.start()
@@ -0,0 +1,140 @@
+from typing import Any, Dict, Iterable, Iterator, Optional
+import hashlib
+import json
+import streamlit as st
+from openai import OpenAI
+from supabase import Client
+from .client_pool import get_supabase
+from ..utils.cache import cache
+
+EXPLANATION_MODEL = "gpt-4o-mini"
+
+EXPLANATION_PROMPT = (
+    "You explain course material to students. Write a comprehensive, well-analyzed "
+    "explanation of the paragraph you are given, between 500 and 700 words, "
+    "presented in a storytelling format. Reply with the explanation only, as "
+    "Markdown, without restating the paragraph."
+)
+
+# Stored explanations never change for a given text, so local copies can live long
+EXPLANATION_TTL = 7 * 24 * 3600
+
+
+def normalize_paragraph(paragraph_text: str) -> str:
+    """The exact text that is explained and hashed"""
+    return (paragraph_text or "").strip()
+
+
+def content_hash(paragraph_text: str) -> str:
+    """Hex SHA-256 of the normalized paragraph text (the explanation_cache key)"""
+    return hashlib.sha256(normalize_paragraph(paragraph_text).encode("utf-8")).hexdigest()
+
+
+def _decode(value: Any) -> Optional[Dict[str, Any]]:
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            return None
+    return value or None
+
+
+class ExplanationEngine:
+    """Streams paragraph explanations from the Chat Completions API.
+
+    Tokens are yielded as they arrive, so the dialog shows the first words
+    after one round trip instead of polling an Assistants run. Finished
+    explanations ({"input_text", "detailed_explanation"}) are stored in
+    ``explanation_cache`` under a hash of the paragraph text, so every copy
+    of a course shares them, and mirrored in the local tiered cache.
+    """
+
+    def __init__(self, model: str = EXPLANATION_MODEL, max_tokens: int = 1200):
+        self.model = model
+        self.max_tokens = max_tokens
+        self._client: Optional[OpenAI] = None
+
+    @property
+    def client(self) -> OpenAI:
+        if self._client is None:
+            self._client = OpenAI(
+                api_key=st.secrets["openai"]["api_key"],
+                organization=st.secrets["openai"]["org_id"]
+            )
+        return self._client
+
+    def load(self, paragraph_text: str, client: Optional[Client] = None) -> Optional[Dict[str, Any]]:
+        """Return the stored explanation for a paragraph text, if any"""
+        key = content_hash(paragraph_text)
+        explanation = cache.get(f"explanation_{key}")
+        if explanation is not None:
+            return explanation
+        try:
+            resp = (client or get_supabase()).table("explanation_cache").select("explanation_json") \
+                .eq("content_hash", key).maybe_single().execute()
+        except Exception:
+            return None
+        explanation = _decode(resp.data.get("explanation_json")) if resp and resp.data else None
+        if explanation:
+            cache.set(f"explanation_{key}", explanation, EXPLANATION_TTL)
+        return explanation
+
+    def cached_hashes(self, hashes: Iterable[str], client: Optional[Client] = None) -> set:
+        """The subset of content hashes that already have an explanation"""
+        hashes = list(set(hashes))
+        found = set()
+        for start in range(0, len(hashes), 100):
+            rows = (client or get_supabase()).table("explanation_cache").select("content_hash") \
+                .in_("content_hash", hashes[start:start + 100]).execute().data or []
+            found.update(row["content_hash"] for row in rows)
+        return found
+
+    def load_legacy(
+        self, course_id: str, week: int, paragraph_id: str, client: Optional[Client] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Explanation stored per course position before explanations were content-addressed"""
+        try:
+            resp = (client or get_supabase()).table("paragraph_explanations").select("explanation_json") \
+                .eq("course_id", course_id).eq("week_number", week).eq("paragraph_id", paragraph_id) \
+                .maybe_single().execute()
+        except Exception:
+            return None
+        return _decode(resp.data.get("explanation_json")) if resp and resp.data else None
+
+    def stream(self, paragraph_text: str) -> Iterator[str]:
+        """Yield the explanation text chunk by chunk"""
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": EXPLANATION_PROMPT},
+                {"role": "user", "content": normalize_paragraph(paragraph_text)},
+            ],
+            max_tokens=self.max_tokens,
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def save(self, paragraph_text: str, explanation: str, client: Optional[Client] = None) -> Dict[str, Any]:
+        """Store a finished explanation under its content hash and return its JSON"""
+        key = content_hash(paragraph_text)
+        explanation_json = {"input_text": normalize_paragraph(paragraph_text), "detailed_explanation": explanation}
+        (client or get_supabase()).rpc("store_explanation", {
+            "content_hash": key,
+            "explanation_json": explanation_json,
+            "model": self.model
+        }).execute()
+        cache.set(f"explanation_{key}", explanation_json, EXPLANATION_TTL)
+        return explanation_json
+
+    def generate(self, paragraph_text: str, client: Optional[Client] = None) -> Dict[str, Any]:
+        """Generate and store an explanation without displaying it.
+
+        Background callers pass the user's ``client`` so the write runs with
+        their auth rather than the shared anonymous client.
+        """
+        return self.save(paragraph_text, "".join(self.stream(paragraph_text)), client=client)
+
+# Initialize global explanation engine instance
+explanation_engine = ExplanationEngine()
@@ -1,35 +1,108 @@
-from typing import Any, Optional
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
 import streamlit as st
-from supabase import create_client, Client
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from supabase import Client
+from .client_pool import get_supabase
 from ..utils.cache import cache
 from ..utils.rate_limiter import rate_limit
 
-class SupabaseWrapper:
-    def __init__(self):
-        self.url = st.secrets["supabase"]["url"]
-        self.key = st.secrets["supabase"]["anon_key"]
-        self._client: Optional[Client] = None
+# Per-key futures for fetches that are currently running
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+def _single_flight(key: str, func: Callable[[], Any]) -> Any:
+    """Run func once per key at a time; concurrent callers wait for the same result"""
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+
+    if not leader:
+        return future.result()
+
+    try:
+        result = func()
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
 
+class SupabaseWrapper:
     @property
     def client(self) -> Client:
-        if not self._client:
-            self._client = create_client(self.url, self.key)
-        return self._client
+        # Per-session client backed by the shared connection pool
+        return get_supabase()
+
+    @rate_limit(max_requests=5, window_seconds=1, wait=True, timeout=5)
+    def _execute_query(
+        self,
+        query_func: callable,
+        cache_key: Optional[str] = None,
+        ttl: int = 3600,
+        stale_ttl: int = 0,
+    ) -> Any:
+        """Run query_func, cached under cache_key for ttl seconds.
+
+        With stale_ttl > 0 an expired entry is still served for up to stale_ttl
+        seconds while a single background refresh replaces it. Concurrent misses
+        on the same key share one in-flight fetch.
+        """
+        if not cache_key:
+            return query_func()
 
-    @rate_limit(max_requests=5, window_seconds=1)
-    def _execute_query(self, query_func: callable, cache_key: Optional[str] = None, ttl: int = 3600) -> Any:
-        if cache_key:
-            cached_result = cache.get(cache_key)
-            if cached_result is not None:
-                return cached_result
+        entry = cache.get(cache_key)
+        if isinstance(entry, dict) and "fresh_until" in entry:
+            if time.time() > entry["fresh_until"]:
+                self._refresh_in_background(query_func, cache_key, ttl, stale_ttl)
+            return entry["value"]
 
+        return self._fetch(query_func, cache_key, ttl, stale_ttl)
+
+    def _load(self, query_func: Callable[[], Any], cache_key: str, ttl: int, stale_ttl: int) -> Any:
         result = query_func()
-        
-        if cache_key:
-            cache.set(cache_key, result, ttl)
-        
+        if result is not None:
+            entry = {"value": result, "fresh_until": time.time() + ttl}
+            cache.set(cache_key, entry, ttl + stale_ttl)
         return result
 
+    def _fetch(self, query_func: Callable[[], Any], cache_key: str, ttl: int, stale_ttl: int) -> Any:
+        return _single_flight(cache_key, lambda: self._load(query_func, cache_key, ttl, stale_ttl))
+
+    def _refresh_in_background(self, query_func: Callable[[], Any], cache_key: str, ttl: int, stale_ttl: int) -> None:
+        # Claim the key before starting the thread, so concurrent stale hits
+        # start one refresh and foreground misses wait on the same future
+        with _inflight_lock:
+            if cache_key in _inflight:
+                return
+            future = _inflight[cache_key] = Future()
+
+        def refresh():
+            try:
+                future.set_result(self._load(query_func, cache_key, ttl, stale_ttl))
+            except BaseException as e:
+                # Keep serving the stale value; the next read retries
+                future.set_exception(e)
+            finally:
+                with _inflight_lock:
+                    _inflight.pop(cache_key, None)
+
+        # Run with the caller's script context so the refresh uses its client
+        thread = threading.Thread(target=refresh, name=f"refresh-{cache_key}", daemon=True)
+        add_script_run_ctx(thread, get_script_run_ctx())
+        try:
+            thread.start()
+        except RuntimeError:
+            with _inflight_lock:
+                _inflight.pop(cache_key, None)
+
     def get_user_profile(self, user_id: str) -> dict:
         def query():
             return (
@@ -54,7 +127,7 @@ class SupabaseWrapper:
             )
         
         result = self._execute_query(query)
-        # Invalidate cache
+        # Invalidate memory and disk tiers together
         cache.delete(f"user_profile_{user_id}")
         return result
 
@@ -82,7 +155,7 @@ class SupabaseWrapper:
             )
         
         self._execute_query(query)
-        # Invalidate cache
+        # Invalidate memory and disk tiers together
         cache.delete(f"course_{course_id}")
 
     def get_public_courses(self, offset: int = 0, limit: int = 8) -> list:
@@ -97,7 +170,8 @@ class SupabaseWrapper:
             )
         
         cache_key = f"public_courses_{offset}_{limit}"
-        return self._execute_query(query, cache_key, ttl=300)  # Cache for 5 minutes
+        # Fresh for 5 minutes, then served stale for up to an hour while refreshing
+        return self._execute_query(query, cache_key, ttl=300, stale_ttl=3600)
 
 # Initialize global Supabase client
 supabase = SupabaseWrapper() 
\ No newline at end of file
@@ -1,5 +1,5 @@
 import streamlit as st
-from supabase import create_client, Client
+from supabase import Client
 import time
 from openai import OpenAI
 
@@ -18,7 +18,10 @@ def render_floating_container(
     max_week: int,
     update_course_final_completion: callable,
     course_dict: dict,
-    subject: str
+    subject: str,
+    current_progress: int,
+    tests_completed: int,
+    completed: bool
 ):
     # Initialize OpenAI client with API key from secrets.toml
     client = OpenAI(
@@ -30,10 +33,6 @@ def render_floating_container(
     with st.container():
         st.header("Progress")
         try:
-            # Get progress from database for this specific course
-            response = supabase.table("courses").select("progress").eq("id", course_id).single().execute()
-            current_progress = int(response.data.get("progress", 0) or 0)
-            
             # Calculate total paragraphs for this course
             total_paragraphs = sum(len(week.get("paragraphs", {})) for week in course_dict.values())
             
@@ -57,11 +56,9 @@ def render_floating_container(
         st.success("Course complete!")
         # Check if all tests are completed
         try:
-            comp = supabase.table("courses").select("completition, completed").eq("id", course_id).single().execute().data
-            tests_completed = int(comp.get("completition") or 0)
             if tests_completed >= duration:  # All tests completed
                 # Update final completion status
-                update_course_final_completion(supabase, course_id)
+                update_course_final_completion(supabase, course_id, completed)
         except Exception as e:
             st.error(f"Could not verify test completion: {e}")
 
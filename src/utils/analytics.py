@@ -1,7 +1,127 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
+from collections import deque
+from pathlib import Path
+import atexit
+import json
+import threading
 import time
 import streamlit as st
-from ..api.supabase_client import supabase
+from ..api.client_pool import get_supabase
+
+class EventBuffer:
+    """Process-wide ring buffer of analytics events with a background flusher.
+
+    Tracking an event is an in-memory append. A daemon thread sends buffered
+    events as one multi-row insert whenever ``batch_size`` events are waiting
+    or ``flush_interval_ms`` has passed. When the buffer is full the oldest
+    event is overwritten and counted as dropped. Batches that fail to insert
+    are appended to a size-capped spill file and replayed after the next
+    successful flush. After a failed flush the flusher waits with exponential
+    backoff (capped at ``max_backoff_ms``) before trying again.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 10000,
+        batch_size: int = 200,
+        flush_interval_ms: int = 2000,
+        spill_path: str = ".cache/analytics_spill.jsonl",
+        max_spill_bytes: int = 16 * 1024 * 1024,
+        max_backoff_ms: int = 60000,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_backoff = max_backoff_ms / 1000
+        self.spill_path = Path(spill_path)
+        self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_spill_bytes = max_spill_bytes
+        self._events: deque = deque(maxlen=capacity)
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self.stats = {"tracked": 0, "flushed": 0, "dropped": 0, "spilled": 0, "spill_dropped": 0, "failed_flushes": 0}
+        threading.Thread(target=self._run, name="analytics-flusher", daemon=True).start()
+        atexit.register(self.flush)
+
+    def push(self, event: Dict[str, Any]) -> None:
+        with self._cond:
+            if len(self._events) == self._events.maxlen:
+                self.stats["dropped"] += 1
+            self._events.append(event)
+            self.stats["tracked"] += 1
+            if len(self._events) >= self.batch_size:
+                self._cond.notify()
+
+    def _run(self):
+        failures = 0
+        while True:
+            if failures:
+                # Back off while inserts fail; events keep collecting in the ring buffer
+                time.sleep(min(self.flush_interval * 2 ** failures, self.max_backoff))
+            else:
+                with self._cond:
+                    self._cond.wait_for(lambda: len(self._events) >= self.batch_size, timeout=self.flush_interval)
+            try:
+                ok = self.flush()
+            except Exception:
+                ok = False
+            failures = 0 if ok else min(failures + 1, 16)
+
+    def _take(self) -> List[Dict[str, Any]]:
+        with self._cond:
+            batch = [self._events.popleft() for _ in range(min(self.batch_size, len(self._events)))]
+        return batch
+
+    def _insert(self, rows: List[Dict[str, Any]]) -> None:
+        get_supabase().table("analytics_events").insert(rows).execute()
+
+    def flush(self) -> bool:
+        """Send everything buffered; failed batches go to the spill file. False on failure"""
+        with self._flush_lock:
+            while True:
+                batch = self._take()
+                if not batch:
+                    break
+                try:
+                    self._insert(batch)
+                    self.stats["flushed"] += len(batch)
+                except Exception:
+                    self.stats["failed_flushes"] += 1
+                    self._spill(batch)
+                    return False
+            return self._replay_spill()
+
+    def _spill(self, batch: List[Dict[str, Any]], replayed: bool = False) -> None:
+        data = "".join(json.dumps(event) + "\n" for event in batch)
+        size = self.spill_path.stat().st_size if self.spill_path.exists() else 0
+        if size + len(data) > self.max_spill_bytes:
+            self.stats["spill_dropped"] += len(batch)
+            return
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            f.write(data)
+        if not replayed:
+            self.stats["spilled"] += len(batch)
+
+    def _replay_spill(self) -> bool:
+        if not self.spill_path.exists():
+            return True
+        ok = True
+        draining = self.spill_path.with_suffix(".draining")
+        self.spill_path.replace(draining)
+        with open(draining, encoding="utf-8") as f:
+            events = [json.loads(line) for line in f if line.strip()]
+        for start in range(0, len(events), self.batch_size):
+            batch = events[start:start + self.batch_size]
+            try:
+                self._insert(batch)
+                self.stats["flushed"] += len(batch)
+            except Exception:
+                # Put the unsent remainder back for the next attempt
+                self.stats["failed_flushes"] += 1
+                self._spill(events[start:], replayed=True)
+                ok = False
+                break
+        draining.unlink()
+        return ok
 
 class Analytics:
     def __init__(self):
@@ -28,8 +148,9 @@ class Analytics:
                 "timestamp": time.time(),
                 "properties": properties or {}
             }
-            
-            supabase.client.table("analytics_events").insert(event_data).execute()
+
+            # Buffered; the background flusher does the insert
+            event_buffer.push(event_data)
         except Exception as e:
             st.error(f"Failed to track event: {e}")
 
@@ -73,5 +194,6 @@ class Analytics:
             "error_message": error_message
         })
 
-# Initialize global analytics instance
+# Initialize global event buffer and analytics instance
+event_buffer = EventBuffer()
 analytics = Analytics() 
\ No newline at end of file
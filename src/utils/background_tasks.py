@@ -1,67 +1,164 @@
+import json
+import os
+import random
+import socket
+import sqlite3
 import threading
-from queue import Queue
-from typing import Any, Callable, Dict, Optional
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+from queue import Full, Queue
+from typing import Any, Callable, Dict, Optional, Tuple
 import time
 import streamlit as st
 
+# Priority lanes: interactive work (LLM calls a user is waiting on) never
+# queues behind batch work (reindexing, cache warm-up) or speculative
+# prefetches
+LANE_INTERACTIVE = "interactive"
+LANE_BATCH = "batch"
+LANE_PREFETCH = "prefetch"
+
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
 class BackgroundTaskManager:
-    def __init__(self):
+    """Runs submitted callables on per-lane worker pools.
+
+    Each lane has its own bounded queue and workers, so a slow task only
+    occupies one worker of its own lane. With ``executor="process"`` the lane
+    workers hand tasks to a shared process pool (functions and arguments must
+    then be picklable). Finished task records expire after ``result_ttl``.
+    """
+
+    def __init__(
+        self,
+        lanes: Optional[Dict[str, int]] = None,
+        executor: str = "thread",
+        max_queue_size: int = 256,
+        result_ttl: float = 3600,
+    ):
+        self.lanes = lanes or {LANE_INTERACTIVE: 4, LANE_BATCH: 1, LANE_PREFETCH: 2}
+        self.result_ttl = result_ttl
         self.tasks: Dict[str, Dict[str, Any]] = {}
-        self.queue: Queue = Queue()
-        self.worker = threading.Thread(target=self._process_queue, daemon=True)
-        self.worker.start()
+        self._lock = threading.Lock()
+        self._executor: Optional[Executor] = None
+        if executor == "process":
+            self._executor = ProcessPoolExecutor(max_workers=sum(self.lanes.values()))
+
+        self.queues: Dict[str, Queue] = {}
+        for lane, workers in self.lanes.items():
+            self.queues[lane] = Queue(maxsize=max_queue_size)
+            for i in range(workers):
+                threading.Thread(
+                    target=self._process_queue, args=(lane,), name=f"tasks-{lane}-{i}", daemon=True
+                ).start()
+        threading.Thread(target=self._expire_results, name="tasks-expiry", daemon=True).start()
 
-    def _process_queue(self):
+    def _process_queue(self, lane: str):
+        queue = self.queues[lane]
         while True:
             try:
-                task_id, func, args, kwargs = self.queue.get()
-                self.tasks[task_id]["status"] = "running"
-                
+                task_id, token, func, args, kwargs = queue.get()
+                with self._lock:
+                    task = self.tasks.get(task_id)
+                    if task is None or task["status"] != "queued" or task["token"] is not token:
+                        continue  # cancelled, expired or resubmitted while waiting
+                    task["status"] = "running"
+                    task["started_at"] = time.time()
+
                 try:
-                    result = func(*args, **kwargs)
-                    self.tasks[task_id].update({
-                        "status": "completed",
-                        "result": result,
-                        "completed_at": time.time()
-                    })
+                    if self._executor is not None:
+                        result = self._executor.submit(func, *args, **kwargs).result()
+                    else:
+                        result = func(*args, **kwargs)
+                    update = {"status": "completed", "result": result}
                 except Exception as e:
-                    self.tasks[task_id].update({
-                        "status": "failed",
-                        "error": str(e),
-                        "completed_at": time.time()
-                    })
+                    update = {"status": "failed", "error": str(e)}
+
+                with self._lock:
+                    update["completed_at"] = time.time()
+                    task.update(update)
             except Exception:
                 continue
             finally:
-                self.queue.task_done()
+                queue.task_done()
+
+    def _expire_results(self, interval: float = 60):
+        while True:
+            time.sleep(interval)
+            self.clear_completed_tasks(age_hours=self.result_ttl / 3600)
 
     def submit_task(
         self,
         task_id: str,
         func: Callable,
         *args,
-        **kwargs
+        lane: str = LANE_INTERACTIVE,
+        timeout: Optional[float] = 5,
+        kwargs: Optional[Dict[str, Any]] = None,
     ) -> str:
-        """Submit a task for background processing"""
-        self.tasks[task_id] = {
-            "status": "queued",
-            "submitted_at": time.time(),
-            "result": None,
-            "error": None,
-            "completed_at": None
-        }
-        
-        self.queue.put((task_id, func, args, kwargs))
+        """Submit a task for background processing.
+
+        Positional ``args`` and the ``kwargs`` dict are passed to ``func``;
+        ``lane`` and ``timeout`` are the manager's own options and never reach
+        the task. Blocks for up to ``timeout`` seconds while the lane's queue
+        is full and then raises ``queue.Full``, so callers feel backpressure
+        instead of growing the queue without bound. Resubmitting a task_id
+        that is still queued or running is a no-op. Each submission carries
+        its own token, so the queue entry of a cancelled submission is skipped
+        even when the task_id has been submitted again.
+        """
+        token = object()
+        with self._lock:
+            existing = self.tasks.get(task_id)
+            if existing and existing["status"] in ("queued", "running"):
+                return task_id
+            self.tasks[task_id] = {
+                "token": token,
+                "status": "queued",
+                "lane": lane,
+                "submitted_at": time.time(),
+                "started_at": None,
+                "result": None,
+                "error": None,
+                "completed_at": None
+            }
+
+        try:
+            self.queues[lane].put((task_id, token, func, args, kwargs or {}), timeout=timeout)
+        except Full:
+            with self._lock:
+                if self.tasks.get(task_id, {}).get("token") is token:
+                    self.tasks.pop(task_id, None)
+            raise
         return task_id
 
+    def cancel_task(self, task_id: str) -> bool:
+        """Cancel a queued task; running tasks cannot be interrupted"""
+        with self._lock:
+            task = self.tasks.get(task_id)
+            if task is None or task["status"] != "queued":
+                return False
+            task.update({"status": "cancelled", "completed_at": time.time()})
+            return True
+
     def get_task_status(self, task_id: str) -> Optional[Dict[str, Any]]:
-        """Get the status of a task"""
-        return self.tasks.get(task_id)
+        """Get the status of a task, including queue and run timings"""
+        with self._lock:
+            task = self.tasks.get(task_id)
+            if task is None:
+                return None
+            status = dict(task)
+        status.pop("token", None)
+        now = time.time()
+        started = status["started_at"]
+        status["queue_seconds"] = (started or status["completed_at"] or now) - status["submitted_at"]
+        status["run_seconds"] = (status["completed_at"] or now) - started if started else None
+        return status
 
     def is_task_complete(self, task_id: str) -> bool:
         """Check if a task is complete"""
         task = self.tasks.get(task_id)
-        return task is not None and task["status"] in ("completed", "failed")
+        return task is not None and task["status"] in FINISHED_STATUSES
 
     def get_task_result(self, task_id: str) -> Optional[Any]:
         """Get the result of a completed task"""
@@ -73,21 +170,323 @@ class BackgroundTaskManager:
     def clear_completed_tasks(self, age_hours: float = 24):
         """Clear completed tasks older than age_hours"""
         current_time = time.time()
-        to_remove = []
-        
-        for task_id, task in self.tasks.items():
-            if (
-                task["status"] in ("completed", "failed") and
-                task["completed_at"] and
-                current_time - task["completed_at"] > age_hours * 3600
-            ):
-                to_remove.append(task_id)
-        
-        for task_id in to_remove:
-            del self.tasks[task_id]
-
-# Initialize global task manager
+        with self._lock:
+            to_remove = [
+                task_id for task_id, task in self.tasks.items()
+                if task["status"] in FINISHED_STATUSES
+                and task["completed_at"]
+                and current_time - task["completed_at"] > age_hours * 3600
+            ]
+            for task_id in to_remove:
+                del self.tasks[task_id]
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth per lane and task counts per status"""
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for task in self.tasks.values():
+                counts[task["status"]] = counts.get(task["status"], 0) + 1
+        return {
+            "queued": {lane: q.qsize() for lane, q in self.queues.items()},
+            "tasks": counts,
+        }
+
+
+def _process_token(pid: int) -> Optional[str]:
+    """Identity of one incarnation of a PID: boot id plus process start time (Linux).
+
+    A restarted container reuses PIDs, but not this token, so leases left by
+    the previous incarnation are recognised as dead.
+    """
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as f:
+            boot_id = f.read().strip()[:8]
+        with open(f"/proc/{pid}/stat") as f:
+            start_ticks = f.read().rsplit(")", 1)[1].split()[19]
+        return f"{boot_id}-{start_ticks}"
+    except (OSError, IndexError):
+        return None
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class PersistentTaskQueue:
+    """Durable task queue in SQLite, shared by all worker processes on a host.
+
+    Tasks are stored as (handler name, JSON payload) and survive restarts.
+    A worker claims a task with a time-limited lease that a heartbeat extends
+    while the handler runs; if the worker dies the lease runs out and another
+    worker picks the task up again. Failures matching the handler's
+    ``retry_on`` are retried with exponential backoff up to ``max_attempts``;
+    anything else fails the task at once, so handlers with side effects can
+    limit retries to errors known to be safe. An idempotency key makes
+    repeated submissions of the same work return the existing task. Workers
+    only claim tasks whose handler they have registered.
+    """
+
+    def __init__(
+        self,
+        db_path: str = ".cache/tasks.db",
+        lease_seconds: float = 120,
+        max_attempts: int = 5,
+        backoff_seconds: float = 5,
+        poll_interval: float = 1,
+    ):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.poll_interval = poll_interval
+        self.handlers: Dict[str, Callable[..., Any]] = {}
+        self.retry_on: Dict[str, Tuple[type, ...]] = {}
+        self._local = threading.local()
+        self._started = False
+        self._start_lock = threading.Lock()
+        self._init_db()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                idempotency_key TEXT UNIQUE,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                run_after REAL NOT NULL,
+                lease_owner TEXT,
+                lease_expires REAL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                completed_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_tasks_claim ON tasks(status, run_after);
+        """)
+
+    def register(
+        self,
+        name: str,
+        func: Optional[Callable[..., Any]] = None,
+        retry_on: Tuple[type, ...] = (Exception,),
+    ):
+        """Register a handler (usable as a decorator); it is called as func(**payload).
+
+        Only exceptions that are instances of ``retry_on`` are retried.
+        """
+        if func is None:
+            return lambda f: self.register(name, f, retry_on)
+        self.handlers[name] = func
+        self.retry_on[name] = retry_on
+        return func
+
+    def enqueue(
+        self,
+        name: str,
+        payload: Optional[Dict[str, Any]] = None,
+        idempotency_key: Optional[str] = None,
+        delay: float = 0,
+    ) -> int:
+        """Persist a task and return its id (the existing id for a known idempotency key)"""
+        now = time.time()
+        self.conn.execute(
+            """
+            INSERT INTO tasks (name, payload, idempotency_key, run_after, created_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(idempotency_key) DO NOTHING
+            """,
+            (name, json.dumps(payload or {}), idempotency_key, now + delay, now)
+        )
+        if idempotency_key:
+            row = self.conn.execute(
+                "SELECT id FROM tasks WHERE idempotency_key = ?", (idempotency_key,)
+            ).fetchone()
+            return row["id"]
+        return self.conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+
+    def get(self, task_id: int) -> Optional[Dict[str, Any]]:
+        """Task record with decoded payload and result"""
+        row = self.conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        if row is None:
+            return None
+        task = dict(row)
+        task["payload"] = json.loads(task["payload"])
+        task["result"] = json.loads(task["result"]) if task["result"] is not None else None
+        return task
+
+    def recover(self) -> int:
+        """Restart-recovery scan: requeue running tasks whose worker is gone.
+
+        That is every expired lease, plus leases held by processes on this
+        host that no longer exist (e.g. the server before a restart). Owners
+        are "host:pid:token:worker"; a live PID whose current token differs
+        is a reused PID, so its lease is stale too.
+        """
+        host = socket.gethostname()
+        stale = []
+        for row in self.conn.execute("SELECT id, lease_owner, lease_expires FROM tasks WHERE status = 'running'"):
+            parts = (row["lease_owner"] or "").split(":")
+            dead = False
+            if len(parts) == 4 and parts[0] == host and parts[1].isdigit():
+                pid, token = int(parts[1]), parts[2]
+                dead = not _pid_alive(pid) or (token != "-" and _process_token(pid) not in (None, token))
+            if (row["lease_expires"] or 0) < time.time() or dead:
+                stale.append((row["id"],))
+        self.conn.executemany(
+            """
+            UPDATE tasks SET status = 'queued', run_after = 0, lease_owner = NULL, lease_expires = NULL
+            WHERE id = ? AND status = 'running'
+            """,
+            stale
+        )
+        return len(stale)
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Lease the next due task this process has a handler for"""
+        names = list(self.handlers)
+        if not names:
+            return None
+        now = time.time()
+        placeholders = ",".join("?" * len(names))
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                f"""
+                SELECT id FROM tasks
+                WHERE name IN ({placeholders})
+                  AND ((status = 'queued' AND run_after <= ?)
+                       OR (status = 'running' AND lease_expires < ?))
+                ORDER BY run_after
+                LIMIT 1
+                """,
+                (*names, now, now)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                """
+                UPDATE tasks
+                SET status = 'running', attempts = attempts + 1, lease_owner = ?,
+                    lease_expires = ?, started_at = ?
+                WHERE id = ?
+                """,
+                (worker_id, now + self.lease_seconds, now, row["id"])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row["id"])
+
+    def complete(self, task_id: int, worker_id: str, result: Any) -> None:
+        # The lease_owner check drops results from a worker whose lease was taken over
+        self.conn.execute(
+            """
+            UPDATE tasks
+            SET status = 'completed', result = ?, error = NULL, completed_at = ?,
+                lease_owner = NULL, lease_expires = NULL
+            WHERE id = ? AND lease_owner = ?
+            """,
+            (json.dumps(result), time.time(), task_id, worker_id)
+        )
+
+    def heartbeat(self, task_id: int, worker_id: str) -> bool:
+        """Extend a held lease; False once the lease has been taken over"""
+        cur = self.conn.execute(
+            "UPDATE tasks SET lease_expires = ? WHERE id = ? AND lease_owner = ? AND status = 'running'",
+            (time.time() + self.lease_seconds, task_id, worker_id)
+        )
+        return cur.rowcount > 0
+
+    def _keep_alive(self, task_id: int, worker_id: str, stop: threading.Event) -> None:
+        while not stop.wait(self.lease_seconds / 3):
+            try:
+                if not self.heartbeat(task_id, worker_id):
+                    return
+            except Exception:
+                continue
+
+    def fail(self, task_id: int, worker_id: str, error: str, attempts: int, retry: bool = True) -> None:
+        now = time.time()
+        if not retry or attempts >= self.max_attempts:
+            status, run_after = "failed", now
+        else:
+            # Exponential backoff with jitter
+            delay = self.backoff_seconds * 2 ** (attempts - 1)
+            status, run_after = "queued", now + delay * random.uniform(0.8, 1.2)
+        self.conn.execute(
+            """
+            UPDATE tasks
+            SET status = ?, run_after = ?, error = ?, lease_owner = NULL, lease_expires = NULL,
+                completed_at = CASE WHEN ? = 'failed' THEN ? ELSE NULL END
+            WHERE id = ? AND lease_owner = ?
+            """,
+            (status, run_after, error, status, now, task_id, worker_id)
+        )
+
+    def _work(self, worker_id: str):
+        while True:
+            try:
+                task = self.claim(worker_id)
+            except Exception:
+                task = None
+            if task is None:
+                time.sleep(self.poll_interval)
+                continue
+            stop = threading.Event()
+            threading.Thread(
+                target=self._keep_alive, args=(task["id"], worker_id, stop),
+                name=f"lease-{task['id']}", daemon=True
+            ).start()
+            try:
+                result = self.handlers[task["name"]](**task["payload"])
+                self.complete(task["id"], worker_id, result)
+            except Exception as e:
+                retry = isinstance(e, self.retry_on.get(task["name"], (Exception,)))
+                self.fail(task["id"], worker_id, str(e), task["attempts"], retry=retry)
+            finally:
+                stop.set()
+
+    def start(self, workers: int = 2) -> None:
+        """Run the recovery scan and start worker threads (once per process)"""
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+        self.recover()
+        pid = os.getpid()
+        host = f"{socket.gethostname()}:{pid}:{_process_token(pid) or '-'}"
+        for i in range(workers):
+            threading.Thread(
+                target=self._work, args=(f"{host}:{i}",), name=f"durable-tasks-{i}", daemon=True
+            ).start()
+
+# Initialize global task manager and durable queue
 task_manager = BackgroundTaskManager()
+persistent_queue = PersistentTaskQueue()
 
 # Example usage:
 # def long_running_task(param1, param2):
@@ -97,7 +496,9 @@ task_manager = BackgroundTaskManager()
 # task_id = task_manager.submit_task(
 #     "addition_task",
 #     long_running_task,
-#     5, 3
+#     5,
+#     kwargs={"param2": 3},
+#     lane=LANE_BATCH
 # )
 #
 # while not task_manager.is_task_complete(task_id):
@@ -105,4 +506,4 @@ task_manager = BackgroundTaskManager()
 #     time.sleep(1)
 #
 # result = task_manager.get_task_result(task_id)
-# st.write(f"Result: {result}") 
\ No newline at end of file
+# st.write(f"Result: {result}")
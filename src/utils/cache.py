@@ -1,72 +1,398 @@
 import sqlite3
 import pickle
+import json
+import threading
 import time
-from typing import Any, Optional
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 from pathlib import Path
 import streamlit as st
 
+# Value codecs: JSON for plain data (query results), pickle for everything else
+CODEC_JSON = "j"
+CODEC_PICKLE = "p"
+
 class LocalCache:
-    def __init__(self, db_path: str = ".cache/streamlit.db"):
+    """SQLite-backed cache shared by all sessions (and processes) on this host.
+
+    Each thread gets its own connection to a WAL-mode database, so readers
+    never block each other. Entries are bounded by a byte budget and evicted
+    by least-recent (``"lru"``) or least-frequent (``"lfu"``) access, and a
+    background compaction job drops expired rows and trims the WAL.
+    """
+
+    def __init__(
+        self,
+        db_path: str = ".cache/streamlit.db",
+        max_bytes: int = 256 * 1024 * 1024,
+        eviction: str = "lru",
+        compaction_interval: float = 600,
+        access_flush_interval: float = 30,
+        max_pending_accesses: int = 4096,
+    ):
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        self.conn = sqlite3.connect(db_path)
+        self.max_bytes = max_bytes
+        self.eviction = eviction
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "writes": 0}
+        # Access stamps are buffered here (key -> [last_access, hits]) and
+        # written in batches, so cache hits never take the write lock
+        self._access_lock = threading.Lock()
+        self._pending_access: Dict[str, List[float]] = {}
+        self.max_pending_accesses = max_pending_accesses
         self._init_db()
+        if compaction_interval:
+            self._start_compaction(compaction_interval, access_flush_interval)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Connection for the calling thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
 
     def _init_db(self):
+        self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        # On an existing file the mode only takes effect after a VACUUM; do it once
+        if self.conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            self.conn.execute("VACUUM")
         with self.conn:
-            self.conn.execute("""
-                CREATE TABLE IF NOT EXISTS cache (
+            self.conn.executescript("""
+                DROP TABLE IF EXISTS cache;
+
+                CREATE TABLE IF NOT EXISTS cache_entries (
                     key TEXT PRIMARY KEY,
                     value BLOB,
+                    codec TEXT,
+                    size INTEGER,
                     timestamp REAL,
-                    ttl REAL
-                )
+                    ttl REAL,
+                    last_access REAL,
+                    hits INTEGER DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache_entries(last_access);
+                CREATE INDEX IF NOT EXISTS idx_cache_hits ON cache_entries(hits, last_access);
+
+                -- Running byte total, maintained by triggers so every process sees it
+                CREATE TABLE IF NOT EXISTS cache_meta (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    total_bytes INTEGER NOT NULL DEFAULT 0
+                );
+                INSERT OR IGNORE INTO cache_meta (id, total_bytes) VALUES (1, 0);
+
+                CREATE TRIGGER IF NOT EXISTS cache_entries_ai AFTER INSERT ON cache_entries BEGIN
+                    UPDATE cache_meta SET total_bytes = total_bytes + new.size WHERE id = 1;
+                END;
+                CREATE TRIGGER IF NOT EXISTS cache_entries_ad AFTER DELETE ON cache_entries BEGIN
+                    UPDATE cache_meta SET total_bytes = total_bytes - old.size WHERE id = 1;
+                END;
+                CREATE TRIGGER IF NOT EXISTS cache_entries_au AFTER UPDATE OF size ON cache_entries BEGIN
+                    UPDATE cache_meta SET total_bytes = total_bytes + new.size - old.size WHERE id = 1;
+                END;
             """)
 
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    # ─── serialization ──────────────────────────────────────────────────
+    @staticmethod
+    def _encode(value: Any) -> Tuple[bytes, str]:
+        """JSON when it round-trips exactly, pickle otherwise (tuples, int keys, objects)"""
+        try:
+            blob = json.dumps(value, separators=(",", ":")).encode()
+            if json.loads(blob) == value:
+                return blob, CODEC_JSON
+        except (TypeError, ValueError):
+            pass
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), CODEC_PICKLE
+
+    @staticmethod
+    def _decode(blob: bytes, codec: str) -> Any:
+        return json.loads(blob) if codec == CODEC_JSON else pickle.loads(blob)
+
+    # ─── public API ─────────────────────────────────────────────────────
+    def get_entry(self, key: str) -> Optional[Tuple[Any, int, float]]:
+        """Return (value, size, expires_at) for a live entry and buffer the access"""
+        row = self.conn.execute(
+            "SELECT value, codec, size, timestamp, ttl FROM cache_entries WHERE key = ?",
+            (key,)
+        ).fetchone()
+
+        if not row:
+            self._count("misses")
+            return None
+
+        value, codec, size, timestamp, ttl = row
+        now = time.time()
+        if ttl > 0 and now - timestamp > ttl:
+            self.delete(key)
+            self._count("expired")
+            self._count("misses")
+            return None
+
+        with self._access_lock:
+            stamp = self._pending_access.setdefault(key, [now, 0])
+            stamp[0] = now
+            stamp[1] += 1
+            overflow = len(self._pending_access) >= self.max_pending_accesses
+        if overflow:
+            self.flush_access()
+        self._count("hits")
+        expires_at = timestamp + ttl if ttl > 0 else float("inf")
+        return self._decode(value, codec), size, expires_at
+
     def get(self, key: str) -> Optional[Any]:
         try:
-            row = self.conn.execute(
-                "SELECT value, timestamp, ttl FROM cache WHERE key = ?",
-                (key,)
-            ).fetchone()
-            
-            if not row:
-                return None
-                
-            value, timestamp, ttl = row
-            if ttl > 0 and time.time() - timestamp > ttl:
-                self.delete(key)
-                return None
-                
-            return pickle.loads(value)
+            entry = self.get_entry(key)
+            return entry[0] if entry else None
         except Exception as e:
             st.error(f"Cache read error: {e}")
             return None
 
     def set(self, key: str, value: Any, ttl: float = 3600) -> None:
         try:
-            with self.conn:
-                self.conn.execute(
-                    "INSERT OR REPLACE INTO cache (key, value, timestamp, ttl) VALUES (?, ?, ?, ?)",
-                    (key, pickle.dumps(value), time.time(), ttl)
-                )
+            blob, codec = self._encode(value)
+            self.set_raw(key, blob, codec, ttl)
         except Exception as e:
             st.error(f"Cache write error: {e}")
 
+    def set_raw(self, key: str, blob: bytes, codec: str, ttl: float = 3600) -> None:
+        """Store an already-encoded value and enforce the byte budget"""
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                """
+                INSERT INTO cache_entries (key, value, codec, size, timestamp, ttl, last_access, hits)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 0)
+                ON CONFLICT(key) DO UPDATE SET
+                    value = excluded.value,
+                    codec = excluded.codec,
+                    size = excluded.size,
+                    timestamp = excluded.timestamp,
+                    ttl = excluded.ttl,
+                    last_access = excluded.last_access
+                """,
+                (key, blob, codec, len(blob), now, ttl, now)
+            )
+        self._count("writes")
+        if self.total_bytes() > self.max_bytes:
+            self.evict()
+
     def delete(self, key: str) -> None:
         with self.conn:
-            self.conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self.conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
 
     def clear(self) -> None:
         with self.conn:
-            self.conn.execute("DELETE FROM cache")
+            self.conn.execute("DELETE FROM cache_entries")
 
     def cleanup(self) -> None:
         with self.conn:
-            self.conn.execute(
-                "DELETE FROM cache WHERE ttl > 0 AND (? - timestamp) > ttl",
+            cur = self.conn.execute(
+                "DELETE FROM cache_entries WHERE ttl > 0 AND (? - timestamp) > ttl",
                 (time.time(),)
             )
+        self._count("expired", max(cur.rowcount, 0))
+
+    # ─── size budget ────────────────────────────────────────────────────
+    def total_bytes(self) -> int:
+        row = self.conn.execute("SELECT total_bytes FROM cache_meta WHERE id = 1").fetchone()
+        return row[0] if row else 0
+
+    def flush_access(self) -> int:
+        """Write buffered access stamps in one transaction; returns the number of keys"""
+        with self._access_lock:
+            pending, self._pending_access = self._pending_access, {}
+        if not pending:
+            return 0
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE cache_entries SET last_access = MAX(last_access, ?), hits = hits + ? WHERE key = ?",
+                [(last_access, hits, key) for key, (last_access, hits) in pending.items()]
+            )
+        return len(pending)
+
+    def evict(self, target_ratio: float = 0.9, batch_size: int = 64) -> int:
+        """Evict entries (LRU or LFU) until the cache is below target_ratio of max_bytes"""
+        self.flush_access()
+        order = "hits, last_access" if self.eviction == "lfu" else "last_access"
+        target = self.max_bytes * target_ratio
+        evicted = 0
+        while self.total_bytes() > target:
+            with self.conn:
+                cur = self.conn.execute(
+                    f"DELETE FROM cache_entries WHERE key IN "
+                    f"(SELECT key FROM cache_entries ORDER BY {order} LIMIT ?)",
+                    (batch_size,)
+                )
+            if cur.rowcount <= 0:
+                break
+            evicted += cur.rowcount
+        self._count("evictions", evicted)
+        return evicted
+
+    def compact(self) -> None:
+        """Drop expired rows, enforce the budget and give freed pages back to the OS"""
+        self.cleanup()
+        if self.total_bytes() > self.max_bytes:
+            self.evict()
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.conn.execute("PRAGMA incremental_vacuum")
+
+    def _start_compaction(self, interval: float, access_flush_interval: float = 30) -> None:
+        def _loop():
+            tick = min(interval, access_flush_interval) if access_flush_interval else interval
+            next_compaction = time.monotonic() + interval
+            while True:
+                time.sleep(tick)
+                try:
+                    self.flush_access()
+                    if time.monotonic() >= next_compaction:
+                        next_compaction = time.monotonic() + interval
+                        self.compact()
+                except Exception:
+                    continue
+
+        threading.Thread(target=_loop, name="cache-compaction", daemon=True).start()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters for this process plus current size"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        stats["entries"] = self.conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+        stats["bytes"] = self.total_bytes()
+        stats["max_bytes"] = self.max_bytes
+        return stats
+
+
+class MemoryCache:
+    """In-process LRU tier shared by every session of this server process.
+
+    Values are kept decoded, so a hit costs a dict lookup. Entries expire
+    individually and the tier is bounded both by entry count and by the
+    encoded size of its values. Cached objects are shared between sessions
+    and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[Any, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            value, size, expires_at = entry
+            if time.time() > expires_at:
+                self._pop(key)
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def set(self, key: str, value: Any, size: int, expires_at: float) -> None:
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._pop(oldest)
+                self._stats["evictions"] += 1
+
+    def _pop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+class TieredCache:
+    """Memory LRU in front of the SQLite cache, with the same get/set/delete API.
+
+    Writes go to both tiers; a disk hit is promoted to memory for the rest of
+    its TTL, and deletes always clear both tiers together.
+    """
+
+    def __init__(self, memory: MemoryCache, disk: LocalCache):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+        try:
+            entry = self.disk.get_entry(key)
+        except Exception as e:
+            st.error(f"Cache read error: {e}")
+            return None
+        if entry is None:
+            return None
+        value, size, expires_at = entry
+        self.memory.set(key, value, size, expires_at)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float = 3600) -> None:
+        try:
+            blob, codec = self.disk._encode(value)
+            self.disk.set_raw(key, blob, codec, ttl)
+        except Exception as e:
+            st.error(f"Cache write error: {e}")
+            return
+        expires_at = time.time() + ttl if ttl > 0 else float("inf")
+        self.memory.set(key, value, len(blob), expires_at)
+
+    def delete(self, key: str) -> None:
+        self.memory.delete(key)
+        self.disk.delete(key)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        self.disk.clear()
+
+    def cleanup(self) -> None:
+        self.disk.cleanup()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"memory": self.memory.stats(), "disk": self.disk.stats()}
 
-# Initialize global cache instance
-cache = LocalCache() 
\ No newline at end of file
+# Initialize global cache instances
+local_cache = LocalCache()
+memory_cache = MemoryCache()
+cache = TieredCache(memory_cache, local_cache)
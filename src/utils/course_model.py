@@ -0,0 +1,150 @@
+import hashlib
+import json
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .cache import cache
+from .json_repair import clean_json, fix_json
+
+# Normalized models only change when the course content does, so they can
+# live for a long time; a new updated_at simply produces a new key
+MODEL_TTL = 7 * 24 * 3600
+
+
+def extract_links(html: str) -> List[List[str]]:
+    """Return [[text, href], …] pairs from <a href="…">text</a> snippets."""
+    pattern = re.compile(r"<a\s[^>]*href=['\"](.*?)['\"][^>]*>(.*?)</a>", re.I | re.S)
+    return [[m.group(2).strip(), m.group(1).strip()] for m in pattern.finditer(html)]
+
+
+def parse_scheme(scheme: str, duration: int) -> Dict[str, Any]:
+    """Convert raw multi-paragraph scheme string → dict[WeekX]['paragraphs']"""
+    course: Dict[str, Any] = {}
+    if re.search(r"Week\s+\d+:", scheme):
+        blocks = re.split(r"(?=Week\s+\d+:)", scheme)
+        for block in blocks:
+            m = re.match(r"Week\s+(\d+):\s*(.*)", block, re.S)
+            if not m:
+                continue
+            wk, payload = int(m.group(1)), m.group(2)
+            course[f"Week{wk}"] = {"paragraphs": {}}
+            paras = re.findall(
+                r"Paragraph\s+\d+:\s*(.*?)(?=\nParagraph\s+\d+:|\nWeek\s+\d+:|\Z)",
+                payload, re.S
+            )
+            for idx, p in enumerate(paras, 1):
+                course[f"Week{wk}"]["paragraphs"][f"Paragraph{idx}"] = {
+                    "text": p.strip(),
+                    "resources": extract_links(p)
+                }
+    else:
+        paras = re.findall(r"Paragraph\s+\d+:\s*(.*?)(?=\nParagraph\s+\d+:|\Z)", scheme, re.S) or [scheme]
+        course["Week1"] = {"paragraphs": {}}
+        for idx, p in enumerate(paras, 1):
+            course["Week1"]["paragraphs"][f"Paragraph{idx}"] = {
+                "text": p.strip(),
+                "resources": extract_links(p)
+            }
+    for i in range(1, duration + 1):
+        course.setdefault(f"Week{i}", {"paragraphs": {}})
+    return course
+
+
+def parse_content(raw_content: Any) -> Dict[str, Any]:
+    """Decode a ``courses.content`` value (dict or LLM JSON text); {} if malformed"""
+    if isinstance(raw_content, dict):
+        return raw_content
+    if isinstance(raw_content, str):
+        try:
+            return json.loads(fix_json(clean_json(raw_content)))
+        except json.JSONDecodeError:
+            return {}
+    return {}
+
+
+def build_course_model(raw_content: Any) -> Optional[Dict[str, Any]]:
+    """Normalize course content into {"duration", "subject", "course_dict"}.
+
+    Returns None when the content is missing or malformed.
+    """
+    content = parse_content(raw_content)
+    if not content:
+        return None
+
+    params = content.get("parameters", {})
+    m = re.match(r"(\d+)", params.get("duration", "1"))
+    if m:
+        duration = int(m.group(1))
+    else:
+        duration = int(params.get("duration", 1) or 1)
+    course_dict: Dict[str, Any] = {}
+
+    if "course_content" in params:
+        for wk_item in params["course_content"]:
+            wk = int(wk_item.get("week_number", 1))
+            key = f"Week{wk}"
+            course_dict[key] = {
+                "paragraphs": {},
+                "supplemental": wk_item.get("supplemental_material", {})
+            }
+            for idx, para in enumerate(wk_item.get("paragraphs", []), 1):
+                course_dict[key]["paragraphs"][f"Paragraph{idx}"] = {
+                    "title": para.get("paragraph_title", ""),
+                    "text": para.get("text", ""),
+                    "resources": [[u, u] for u in para.get("resources", [])]
+                }
+        for i in range(1, duration+1):
+            course_dict.setdefault(f"Week{i}", {"paragraphs": {}, "supplemental": {}})
+    else:
+        course_dict = parse_scheme(content.get("scheme", ""), duration)
+
+    return {
+        "duration": duration,
+        "subject": content.get("topic", params.get("main_subject", "Untitled Course")),
+        "course_dict": course_dict,
+    }
+
+
+def completion_counts(model: Dict[str, Any]) -> Tuple[int, int]:
+    """(last week, items in it): the counts save_course_progress checks a completion against"""
+    weeks = int(model["duration"])
+    paragraphs = model["course_dict"].get(f"Week{weeks}", {}).get("paragraphs", {})
+    return weeks, sum(len(para.get("resources", [])) for para in paragraphs.values())
+
+
+def model_cache_key(course_id: str, updated_at: Optional[str], raw_content: Any = None) -> str:
+    """Cache key for a course version; falls back to a content hash without updated_at"""
+    if updated_at:
+        return f"course_model_{course_id}_{updated_at}"
+    digest = hashlib.sha1(json.dumps(raw_content, sort_keys=True, default=str).encode()).hexdigest()
+    return f"course_model_{course_id}_{digest}"
+
+
+def model_source(course_id: str, row: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+    """(cache id, version) of a course row; saved copies key on their shared immutable blob"""
+    if row.get("blob_hash"):
+        return f"blob_{row['blob_hash']}", "immutable"
+    return course_id, row.get("updated_at")
+
+
+def get_course_model(
+    course_id: str,
+    updated_at: Optional[str],
+    load_content: Callable[[], Any],
+) -> Optional[Dict[str, Any]]:
+    """Return the normalized model for one course version, parsing it at most once.
+
+    ``load_content`` fetches the raw ``content`` column and is only called on a
+    cache miss (or when there is no updated_at to key on). Models are cached
+    in the process-wide memory tier and in LocalCache, so reruns (and other
+    sessions) reuse them. Callers must not mutate the result.
+    """
+    raw_content = None if updated_at else load_content()
+    key = model_cache_key(course_id, updated_at, raw_content)
+    model = cache.get(key)
+    if model is None:
+        if raw_content is None:
+            raw_content = load_content()
+        model = build_course_model(raw_content)
+        if model is not None:
+            cache.set(key, model, MODEL_TTL)
+    return model
@@ -0,0 +1,66 @@
+import re
+
+# A JSON string literal, unrolled so the regex engine never backtracks. The
+# closing quote is optional so an unterminated final string still matches.
+_STRING = r'"(?P<plain>[^"\\]*(?:\\.?[^"\\]*)*)"?'
+# The same delimited by typographic quotes, as LLMs sometimes emit
+_SMART_STRING = r'[“”](?P<smart>[^“”\\]*(?:\\.?[^“”\\]*)*)[“”]?'
+_LITERAL_RE = re.compile(f"{_STRING}|{_SMART_STRING}", re.S)
+
+_TRAILING_COMMA_RE = re.compile(r",(\s*[}\]])")
+_CONTROL_RE = re.compile(r"[\x00-\x1f]")
+_ESCAPE_RE = re.compile(r"\\(u[0-9a-fA-F]{4}|.?)", re.S)
+# In smart-quoted strings a straight quote is content and must be escaped too
+_SMART_ESCAPE_RE = re.compile(r'\\(u[0-9a-fA-F]{4}|.?)|"', re.S)
+
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t", "\b": "\\b", "\f": "\\f"}
+
+
+def clean_json(s: str) -> str:
+    """Remove code-block fencing and whitespace around JSON strings."""
+    return re.sub(r"`(?:json|python)?\n?|\n`", "", s).strip()
+
+
+def _escape_control(m: "re.Match[str]") -> str:
+    ch = m.group(0)
+    return _CONTROL_ESCAPES.get(ch) or f"\\u{ord(ch):04x}"
+
+
+def _fix_escape(m: "re.Match[str]") -> str:
+    # Keep valid escapes; turn a stray backslash (e.g. LaTeX "\(" or a "\u"
+    # without four hex digits) into a literal one
+    ch = m.group(1)
+    if ch is None:
+        return '\\"'
+    return m.group(0) if len(ch) == 5 or (ch and ch in '"\\/bfnrt') else "\\\\" + ch
+
+
+def _repair_string(m: "re.Match[str]") -> str:
+    """Normalize one string literal: straight quotes, valid escapes, no raw control chars"""
+    body = m.group("plain")
+    if body is None:
+        body = _SMART_ESCAPE_RE.sub(_fix_escape, m.group("smart"))
+    elif "\\" in body:
+        body = _ESCAPE_RE.sub(_fix_escape, body)
+    if _CONTROL_RE.search(body):
+        body = _CONTROL_RE.sub(_escape_control, body)
+    return f'"{body}"'
+
+
+def fix_json(s: str) -> str:
+    """Repair common LLM JSON defects in one linear pass.
+
+    Handles raw newlines and other control characters inside strings, invalid
+    backslash escapes, strings delimited by smart quotes, trailing commas
+    before ``}``/``]`` and an unterminated final string.
+    """
+    parts = []
+    pos = 0
+    for m in _LITERAL_RE.finditer(s):
+        if m.start() > pos:
+            parts.append(_TRAILING_COMMA_RE.sub(r"\1", s[pos:m.start()]))
+        parts.append(_repair_string(m))
+        pos = m.end()
+    if pos < len(s):
+        parts.append(_TRAILING_COMMA_RE.sub(r"\1", s[pos:]))
+    return "".join(parts)
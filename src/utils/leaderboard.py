@@ -0,0 +1,57 @@
+from typing import Any, Dict, List, Optional
+import streamlit as st
+from ..api.client_pool import get_supabase
+from .xp_manager import levels_for
+
+class Leaderboard:
+    """Read API over the trigger-maintained ``leaderboard`` table.
+
+    Ranks are computed when read, by an index-only count of users with more
+    XP (see migration 008), so awarding XP never re-ranks other users.
+    """
+
+    def _with_levels(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        levels = levels_for([row.get("xp") or 0 for row in rows]) if rows else []
+        for row, level in zip(rows, levels):
+            row["level"] = int(level)
+        return rows
+
+    def get_page(
+        self,
+        page_size: int = 20,
+        after: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """One page ordered by rank; pass the last row of the previous page as ``after``"""
+        try:
+            rows = get_supabase().rpc("get_leaderboard", {
+                "page_size": page_size,
+                "after_xp": after["xp"] if after else None,
+                "after_user_id": after["user_id"] if after else None,
+            }).execute().data or []
+            return self._with_levels(rows)
+        except Exception as e:
+            st.error(f"Failed to load leaderboard: {e}")
+            return []
+
+    def get_position(self, user_id: str, neighbors: int = 2) -> Dict[str, Any]:
+        """Return {"rank", "percentile", "neighbors"} for a user ({} if unranked)"""
+        try:
+            rows = get_supabase().rpc("get_leaderboard_position", {
+                "target_user_id": user_id,
+                "neighbors": neighbors,
+            }).execute().data or []
+        except Exception as e:
+            st.error(f"Failed to load leaderboard position: {e}")
+            return {}
+
+        me = next((row for row in rows if row.get("is_target")), None)
+        if me is None:
+            return {}
+        return {
+            "rank": me["rank"],
+            "percentile": me["percentile"],
+            "neighbors": self._with_levels(rows),
+        }
+
+# Initialize global leaderboard instance
+leaderboard = Leaderboard()
@@ -0,0 +1,177 @@
+import base64
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional
+import streamlit as st
+from ..api.client_pool import get_supabase
+
+# Columns the UI reads from user_profile. They are fetched together, so the
+# sidebar, the dashboard and the profile page share a single round trip.
+PROFILE_COLUMNS = ("user_id", "profile_name", "profile_pic", "xp", "bio", "updated_at")
+
+RUN_CACHE_KEY = "_profile_loader_run"
+
+class ProfileLoader:
+    """Request-scoped loader (DataLoader style) for ``user_profile`` rows.
+
+    All lookups for a user made during one script run are served from a single
+    query; a later request for a column outside the loaded set fetches only the
+    missing columns and merges them into the cached row.
+    """
+
+    def __init__(self, columns: Iterable[str] = PROFILE_COLUMNS):
+        self.columns = tuple(columns)
+
+    def _run_cache(self) -> Dict[str, Dict[str, Any]]:
+        if RUN_CACHE_KEY not in st.session_state:
+            st.session_state[RUN_CACHE_KEY] = {}
+        return st.session_state[RUN_CACHE_KEY]
+
+    def begin_run(self):
+        """Start a new script run: forget the rows loaded by the previous run"""
+        st.session_state[RUN_CACHE_KEY] = {}
+
+    def invalidate(self, user_id: str):
+        """Drop a cached row after the profile has been written"""
+        self._run_cache().pop(user_id, None)
+
+    def load(self, user_id: str, columns: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Return the profile row for one user ({} if the user has no profile)"""
+        return self.load_many([user_id], columns).get(user_id, {})
+
+    def load_many(
+        self,
+        user_ids: Iterable[str],
+        columns: Optional[Iterable[str]] = None,
+        with_defaults: bool = True,
+    ) -> Dict[str, Dict[str, Any]]:
+        """Return {user_id: row} for many users, fetching all cache misses in one ``in_`` query.
+
+        Pass ``with_defaults=False`` to fetch only the requested columns, e.g. to
+        hydrate a list of authors without pulling every profile picture.
+        """
+        run = self._run_cache()
+        wanted = set(columns or self.columns) | {"user_id"}
+        ids: List[str] = list(dict.fromkeys(uid for uid in user_ids if uid))
+
+        to_fetch = [uid for uid in ids if uid not in run or not wanted <= run[uid]["columns"]]
+        if to_fetch:
+            # First load of a user pulls the default column set as well, so the
+            # remaining lookups of this run are cache hits.
+            select_cols = set(wanted)
+            for uid in to_fetch:
+                if with_defaults and uid not in run:
+                    select_cols |= set(self.columns)
+            select_cols.add("user_id")
+
+            rows = (
+                get_supabase().table("user_profile")
+                .select(", ".join(sorted(select_cols)))
+                .in_("user_id", to_fetch)
+                .execute()
+                .data
+                or []
+            )
+            by_id = {row["user_id"]: row for row in rows}
+            for uid in to_fetch:
+                entry = run.setdefault(uid, {"columns": set(), "row": {}})
+                if uid in by_id:
+                    entry["row"].update(by_id[uid])
+                entry["columns"] |= select_cols
+
+        return {uid: run[uid]["row"] for uid in ids}
+
+
+class AvatarCache:
+    """Process-wide LRU of profile picture data URIs keyed by (user_id, updated_at) tuples.
+
+    Decoding the hex ``profile_pic`` and base64-encoding it is the expensive part
+    of rendering an avatar; a changed profile gets a new ``updated_at`` and thus
+    a new key, so stale pictures simply age out.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, str]" = OrderedDict()
+        # user_id -> updated_at of that user's cached picture
+        self._versions: Dict[Hashable, Hashable] = {}
+        self._lock = threading.Lock()
+
+    def has_user(self, user_id: Hashable) -> bool:
+        """True if some version of the user's picture is cached"""
+        with self._lock:
+            return user_id in self._versions
+
+    def get(self, key: Hashable) -> Optional[str]:
+        with self._lock:
+            uri = self._entries.get(key)
+            if uri is not None:
+                self._entries.move_to_end(key)
+            return uri
+
+    def set(self, key: Hashable, uri: str) -> None:
+        with self._lock:
+            self._entries[key] = uri
+            self._entries.move_to_end(key)
+            user_id, version = key
+            self._versions[user_id] = version
+            while len(self._entries) > self.max_entries:
+                (user_id, version), _ = self._entries.popitem(last=False)
+                if self._versions.get(user_id) == version:
+                    del self._versions[user_id]
+
+
+def pic_to_data_uri(pic_data: Any) -> Optional[str]:
+    """Convert a bytea ``profile_pic`` value ("\\x..." hex) to a PNG data URI"""
+    if isinstance(pic_data, str) and pic_data.startswith("\\x"):
+        try:
+            return f"data:image/png;base64,{base64.b64encode(bytes.fromhex(pic_data[2:])).decode()}"
+        except ValueError:
+            return None
+    return None
+
+
+# Initialize global profile loader and avatar cache
+profile_loader = ProfileLoader()
+avatar_cache = AvatarCache()
+
+
+def avatar_uri(profile: Dict[str, Any], default: str) -> str:
+    """Data URI for a loaded profile row, served from the avatar LRU when possible"""
+    if not profile:
+        return default
+    key = (profile.get("user_id"), profile.get("updated_at"))
+    uri = avatar_cache.get(key)
+    if uri is None:
+        uri = pic_to_data_uri(profile.get("profile_pic")) or ""
+        avatar_cache.set(key, uri)
+    return uri or default
+
+
+def load_authors(user_ids: Iterable[str], default_avatar: str) -> Dict[str, Dict[str, str]]:
+    """Hydrate {user_id: {"name", "avatar"}} for a list of authors in one query.
+
+    ``profile_pic`` is part of that query only when some author has no cached
+    picture yet, so a warm page skips the picture bytes and a cold page still
+    costs a single ``user_profile`` query. A second query is made only for
+    authors whose cached picture is outdated (their profile changed).
+    """
+    ids = list(dict.fromkeys(uid for uid in user_ids if uid))
+    if not ids:
+        return {}
+    columns = ["profile_name", "updated_at"]
+    if not all(avatar_cache.has_user(uid) for uid in ids):
+        columns.append("profile_pic")
+    rows = profile_loader.load_many(ids, columns, with_defaults=False)
+    stale = [uid for uid in ids if avatar_cache.get((uid, rows[uid].get("updated_at"))) is None]
+    if stale:
+        profile_loader.load_many(stale, ["profile_name", "updated_at", "profile_pic"], with_defaults=False)
+
+    authors = {}
+    for uid in ids:
+        row = rows[uid]
+        authors[uid] = {
+            "name": row.get("profile_name") or "Anonymous User",
+            "avatar": avatar_uri({"user_id": uid, **row}, default_avatar),
+        }
+    return authors
@@ -0,0 +1,133 @@
+from typing import Any, Dict, Optional, Tuple
+import atexit
+import threading
+import time
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from ..api.client_pool import get_supabase
+
+SESSION_PROGRESS_KEY = "_course_progress"
+
+class ProgressBuffer:
+    """Write-behind buffer for course progress.
+
+    Recording progress only updates session state and a process-wide pending
+    map, where later values for the same (session, course) are merged into
+    the pending entry. A daemon thread writes an entry once no new value has arrived for
+    ``debounce_seconds`` (or at the latest after ``max_delay_seconds``), so
+    paging quickly through a week costs one ``save_course_progress`` call.
+    ``flush_session`` makes the current session's entries due immediately and
+    is called when the user leaves a page. Failed writes are retried with
+    backoff unless a newer value supersedes them.
+    """
+
+    def __init__(self, debounce_seconds: float = 3.0, max_delay_seconds: float = 15.0, max_retries: int = 3):
+        self.debounce = debounce_seconds
+        self.max_delay = max_delay_seconds
+        self.max_retries = max_retries
+        self._pending: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._cond = threading.Condition()
+        self.stats = {"recorded": 0, "written": 0, "failed_writes": 0, "completions": 0}
+        threading.Thread(target=self._run, name="progress-flusher", daemon=True).start()
+        atexit.register(self.flush_all)
+
+    def _session_id(self) -> str:
+        ctx = get_script_run_ctx()
+        return ctx.session_id if ctx else "background"
+
+    def record(self, course_id: str, progress: int, week: int, weeks: int, week_total: int = 0) -> None:
+        """Buffer the latest progress of a course for the current session.
+
+        ``week_total`` is the number of items in ``week`` (0 for plain
+        navigation). Once all items of the last week are checked, the entry
+        keeps a completion claim that later values cannot drop; the server
+        verifies it against the stored course content.
+        """
+        st.session_state.setdefault(SESSION_PROGRESS_KEY, {})[course_id] = progress
+        key = (self._session_id(), course_id)
+        now = time.monotonic()
+        with self._cond:
+            entry = self._pending.get(key) or {
+                "client": get_supabase(),
+                "session_id": key[0],
+                "course_id": course_id,
+                "checked": None,
+                "first_seen": now,
+            }
+            entry["progress"] = progress
+            if week == weeks and week_total > 0 and progress >= week_total:
+                checked = entry["checked"]
+                entry["checked"] = (week, max(progress, checked[1] if checked else 0))
+            entry["due"] = min(now + self.debounce, entry["first_seen"] + self.max_delay)
+            self._pending[key] = entry
+            self.stats["recorded"] += 1
+            self._cond.notify()
+
+    def current(self, course_id: str, default: int = 0) -> int:
+        """Latest progress seen by this session (falls back to the stored value)"""
+        return st.session_state.get(SESSION_PROGRESS_KEY, {}).get(course_id, default)
+
+    def flush_session(self, session_id: Optional[str] = None) -> None:
+        """Make every pending entry of a session due now (written in the background)"""
+        session_id = session_id or self._session_id()
+        with self._cond:
+            for (sid, _), entry in self._pending.items():
+                if sid == session_id:
+                    entry["due"] = 0
+            self._cond.notify()
+
+    def flush_all(self) -> None:
+        """Write every pending entry synchronously (used at interpreter exit)"""
+        with self._cond:
+            entries = list(self._pending.values())
+            self._pending.clear()
+        for entry in entries:
+            self._write(entry)
+
+    def _take_due(self) -> Tuple[list, Optional[float]]:
+        now = time.monotonic()
+        due = [key for key, entry in self._pending.items() if entry["due"] <= now]
+        entries = [self._pending.pop(key) for key in due]
+        next_due = min((entry["due"] for entry in self._pending.values()), default=None)
+        return entries, None if next_due is None else max(next_due - now, 0)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                entries, wait = self._take_due()
+                if not entries:
+                    self._cond.wait(timeout=wait)
+                    continue
+            for entry in entries:
+                self._write(entry)
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        try:
+            completed = entry["client"].rpc("save_course_progress", {
+                "target_course_id": entry["course_id"],
+                "new_progress": entry["progress"],
+                "checked_week": entry["checked"][0] if entry["checked"] else None,
+                "checked_items": entry["checked"][1] if entry["checked"] else None,
+            }).execute().data
+            with self._cond:
+                self.stats["written"] += 1
+                if completed:
+                    self.stats["completions"] += 1
+        except Exception:
+            # Retry later unless a newer value has been recorded meanwhile;
+            # a completion claim is carried over into that newer entry
+            key = (entry["session_id"], entry["course_id"])
+            with self._cond:
+                self.stats["failed_writes"] += 1
+                newer = self._pending.get(key)
+                if newer is not None:
+                    if entry["checked"] and not newer["checked"]:
+                        newer["checked"] = entry["checked"]
+                elif entry.get("retries", 0) < self.max_retries:
+                    entry["retries"] = entry.get("retries", 0) + 1
+                    entry["due"] = time.monotonic() + self.debounce * 2 ** entry["retries"]
+                    self._pending[key] = entry
+                    self._cond.notify()
+
+# Initialize global progress buffer instance
+progress_buffer = ProgressBuffer()
@@ -1,63 +1,179 @@
+import sqlite3
+import threading
 import time
 from functools import wraps
-from typing import Callable, Dict, List
+from pathlib import Path
+from typing import Callable, Dict, Optional
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+class MemoryBackend:
+    """Per-process GCRA state: one theoretical arrival time (TAT) per key"""
+
+    def __init__(self):
+        self._tat: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def peek(self, key: str) -> float:
+        with self._lock:
+            return self._tat.get(key, 0.0)
+
+    def acquire(self, key: str, interval: float, burst: float, now: float) -> float:
+        """Consume one slot if allowed; return 0, or the seconds until one frees up"""
+        with self._lock:
+            tat = max(self._tat.get(key, 0.0), now)
+            wait = tat - burst - now
+            if wait > 0:
+                return wait
+            self._tat[key] = tat + interval
+            return 0.0
+
+
+class SQLiteBackend:
+    """GCRA state in a SQLite file, so several server processes share one budget"""
+
+    def __init__(self, db_path: str = ".cache/rate_limits.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, tat REAL NOT NULL)")
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def peek(self, key: str) -> float:
+        row = self.conn.execute("SELECT tat FROM rate_limits WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0.0
+
+    def acquire(self, key: str, interval: float, burst: float, now: float) -> float:
+        conn = self.conn
+        # IMMEDIATE takes the write lock up front, making read-check-write atomic
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tat FROM rate_limits WHERE key = ?", (key,)).fetchone()
+            tat = max(row[0] if row else 0.0, now)
+            wait = tat - burst - now
+            if wait <= 0:
+                conn.execute(
+                    "INSERT INTO rate_limits (key, tat) VALUES (?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET tat = excluded.tat",
+                    (key, tat + interval)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return max(wait, 0.0)
+
 
 class RateLimiter:
-    def __init__(self, max_requests: int = 5, window_seconds: int = 1):
+    """GCRA limiter: max_requests per window_seconds per key, bursts up to max_requests.
+
+    Each key stores a single timestamp, so every check is O(1) regardless of
+    the request rate.
+    """
+
+    def __init__(self, max_requests: int = 5, window_seconds: int = 1, backend=None):
         self.max_requests = max_requests
         self.window_seconds = window_seconds
-        self.requests: Dict[str, List[float]] = {}
-
-    def _cleanup_old_requests(self, key: str):
-        if key not in self.requests:
-            self.requests[key] = []
-        
-        current_time = time.time()
-        self.requests[key] = [
-            req_time for req_time in self.requests[key]
-            if current_time - req_time <= self.window_seconds
-        ]
+        self.interval = window_seconds / max_requests
+        self.burst = window_seconds - self.interval
+        self.backend = backend or MemoryBackend()
+
+    def try_acquire(self, key: str) -> float:
+        """Take a slot for key; returns 0 on success, else seconds to wait"""
+        return self.backend.acquire(key, self.interval, self.burst, time.time())
+
+    def acquire(self, key: str, timeout: Optional[float] = None) -> bool:
+        """Block until a slot is free (or timeout elapses); returns whether one was taken"""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            wait = self.try_acquire(key)
+            if wait <= 0:
+                return True
+            if deadline is not None and time.time() + wait > deadline:
+                return False
+            time.sleep(wait)
 
     def is_allowed(self, key: str) -> bool:
-        self._cleanup_old_requests(key)
-        return len(self.requests[key]) < self.max_requests
+        return self.time_until_next(key) <= 0
 
     def add_request(self, key: str):
-        self._cleanup_old_requests(key)
-        self.requests[key].append(time.time())
+        self.try_acquire(key)
 
     def time_until_next(self, key: str) -> float:
-        if self.is_allowed(key):
-            return 0
-        oldest_request = min(self.requests[key])
-        return self.window_seconds - (time.time() - oldest_request)
+        return max(self.backend.peek(key) - self.burst - time.time(), 0.0)
+
+
+def user_key() -> str:
+    """Rate-limit key for the current user (or session, or background thread)"""
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return "background"
+    user = st.session_state.get("user")
+    if user and user.get("id"):
+        return f"user:{user['id']}"
+    return f"session:{ctx.session_id}"
+
+
+# Shared across worker processes on this host; created on first use
+_shared_backend: Optional[SQLiteBackend] = None
+_shared_backend_lock = threading.Lock()
+
+def shared_backend() -> SQLiteBackend:
+    global _shared_backend
+    with _shared_backend_lock:
+        if _shared_backend is None:
+            _shared_backend = SQLiteBackend()
+        return _shared_backend
+
 
 def rate_limit(
     max_requests: int = 5,
     window_seconds: int = 1,
-    key_func: Callable = lambda: "default"
+    key_func: Callable = user_key,
+    wait: bool = False,
+    timeout: Optional[float] = None,
+    shared: bool = False,
 ):
-    limiter = RateLimiter(max_requests, window_seconds)
-    
+    """Limit calls per key_func() (per user by default).
+
+    With wait=True callers queue until a slot frees up (at most timeout
+    seconds) instead of getting None; shared=True enforces the budget across
+    all server processes through SQLite.
+    """
+    limiter = RateLimiter(max_requests, window_seconds, shared_backend() if shared else None)
+
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
             key = key_func()
-            
-            if not limiter.is_allowed(key):
+
+            if wait:
+                allowed = limiter.acquire(key, timeout)
+            else:
+                allowed = limiter.try_acquire(key) <= 0
+
+            if not allowed:
                 wait_time = limiter.time_until_next(key)
                 st.warning(
                     f"Rate limit exceeded. Please wait {wait_time:.1f} seconds."
                 )
                 return None
-            
-            limiter.add_request(key)
+
             return func(*args, **kwargs)
         return wrapper
     return decorator
 
 # Example usage:
-# @rate_limit(max_requests=5, window_seconds=60)
+# @rate_limit(max_requests=5, window_seconds=60, wait=True, timeout=10)
 # def api_call():
-#     pass 
\ No newline at end of file
+#     pass
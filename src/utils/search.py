@@ -1,57 +1,296 @@
+import logging
 import sqlite3
-from typing import List, Dict, Any
+import threading
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+import re
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import json
+from ..api.client_pool import get_supabase
+
+logger = logging.getLogger(__name__)
+
+# Columns pulled from Supabase when syncing the index
+SYNC_COLUMNS = "id, title, content:course_content, rating, skill_level, updated_at, Public"
 
 class CourseSearch:
-    def __init__(self, db_path: str = ".cache/search.db"):
-        self.conn = sqlite3.connect(db_path)
+    def __init__(
+        self,
+        db_path: str = ".cache/search.db",
+        title_weight: float = 10.0,
+        content_weight: float = 1.0,
+    ):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # BM25 column weights: a hit in the title counts as much as
+        # title_weight / content_weight hits in the body
+        self.title_weight = title_weight
+        self.content_weight = content_weight
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._sync_running = threading.Event()
         self._init_db()
 
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """One connection per thread (script threads and background sync)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
     def _init_db(self):
-        """Initialize the FTS5 virtual table"""
+        """Initialize the document table and its external-content FTS5 index"""
         with self.conn:
-            # Create the FTS5 table for course content
-            self.conn.execute("""
-                CREATE VIRTUAL TABLE IF NOT EXISTS course_content USING fts5(
-                    course_id,
+            self.conn.executescript("""
+                DROP TABLE IF EXISTS course_content;
+
+                CREATE TABLE IF NOT EXISTS course_docs (
+                    rowid INTEGER PRIMARY KEY,
+                    course_id TEXT NOT NULL UNIQUE,
+                    updated_at TEXT,
+                    title TEXT,
+                    content TEXT,
+                    metadata TEXT
+                );
+
+                CREATE VIRTUAL TABLE IF NOT EXISTS course_fts USING fts5(
                     title,
                     content,
-                    metadata
-                )
+                    content='course_docs',
+                    content_rowid='rowid',
+                    tokenize='porter unicode61'
+                );
+
+                -- Keep the FTS index in sync with course_docs
+                CREATE TRIGGER IF NOT EXISTS course_docs_ai AFTER INSERT ON course_docs BEGIN
+                    INSERT INTO course_fts(rowid, title, content) VALUES (new.rowid, new.title, new.content);
+                END;
+                CREATE TRIGGER IF NOT EXISTS course_docs_ad AFTER DELETE ON course_docs BEGIN
+                    INSERT INTO course_fts(course_fts, rowid, title, content) VALUES ('delete', old.rowid, old.title, old.content);
+                END;
+                CREATE TRIGGER IF NOT EXISTS course_docs_au AFTER UPDATE ON course_docs BEGIN
+                    INSERT INTO course_fts(course_fts, rowid, title, content) VALUES ('delete', old.rowid, old.title, old.content);
+                    INSERT INTO course_fts(rowid, title, content) VALUES (new.rowid, new.title, new.content);
+                END;
+
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    name TEXT PRIMARY KEY,
+                    value TEXT
+                );
             """)
 
-    def index_course(self, course_id: str, title: str, content: Dict[str, Any], metadata: Dict[str, Any] = None):
-        """Index a course's content for searching"""
+    # ─── indexing ───────────────────────────────────────────────────────
+    def _to_row(self, course: Dict[str, Any]) -> Tuple[str, Optional[str], str, str, str]:
+        metadata = {
+            "level": course.get("skill_level") or course.get("level"),
+            "rating": course.get("rating"),
+            "public": bool(course.get("Public", course.get("public", False))),
+        }
+        return (
+            str(course["id"]),
+            course.get("updated_at"),
+            course.get("title") or "Untitled",
+            self._content_to_text(course.get("content") or {}),
+            json.dumps(metadata),
+        )
+
+    def index_course(self, course_id: str, title: str, content: Dict[str, Any], metadata: Dict[str, Any] = None, updated_at: Optional[str] = None):
+        """Index (or re-index) a single course's content for searching"""
+        self.index_courses([{
+            "id": course_id,
+            "title": title,
+            "content": content,
+            "updated_at": updated_at,
+            **(metadata or {}),
+        }])
+
+    def index_courses(self, courses: Iterable[Dict[str, Any]]) -> int:
+        """Incrementally upsert many courses in one transaction; returns the number written.
+
+        Courses whose updated_at matches the indexed version are skipped before
+        their content is flattened, and non-public courses are removed.
+        """
+        courses = list(courses)
+        if not courses:
+            return 0
         try:
-            # Convert content to searchable text
-            searchable_content = self._content_to_text(content)
-            metadata_json = json.dumps(metadata) if metadata else "{}"
-            
-            # Insert or replace in FTS5 table
-            with self.conn:
-                self.conn.execute(
-                    "INSERT OR REPLACE INTO course_content (course_id, title, content, metadata) VALUES (?, ?, ?, ?)",
-                    (course_id, title, searchable_content, metadata_json)
+            # Look up only this batch's ids, so a full sync stays linear in its size
+            ids = [str(course["id"]) for course in courses]
+            known = {}
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                known.update(self.conn.execute(
+                    f"SELECT course_id, updated_at FROM course_docs WHERE course_id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ))
+            upserts, removals = [], []
+            for course in courses:
+                course_id = str(course["id"])
+                if not course.get("Public", course.get("public", True)):
+                    removals.append((course_id,))
+                elif course.get("updated_at") is None or known.get(course_id) != course.get("updated_at"):
+                    upserts.append(self._to_row(course))
+
+            with self._write_lock, self.conn:
+                self.conn.executemany(
+                    """
+                    INSERT INTO course_docs (course_id, updated_at, title, content, metadata)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(course_id) DO UPDATE SET
+                        updated_at = excluded.updated_at,
+                        title = excluded.title,
+                        content = excluded.content,
+                        metadata = excluded.metadata
+                    """,
+                    upserts,
                 )
+                self.conn.executemany("DELETE FROM course_docs WHERE course_id = ?", removals)
+            return len(upserts) + len(removals)
         except Exception as e:
-            st.error(f"Failed to index course: {e}")
+            if get_script_run_ctx() is None:
+                raise  # background sync: logged and counted by sync_if_stale
+            st.error(f"Failed to index courses: {e}")
+            return 0
+
+    def reindex_all_courses(self, courses: List[Dict[str, Any]]):
+        """Rebuild the whole index from scratch in a single transaction"""
+        try:
+            rows = [self._to_row(course) for course in courses]
+            with self._write_lock, self.conn:
+                self.conn.execute("DELETE FROM course_docs")
+                self.conn.executemany(
+                    "INSERT INTO course_docs (course_id, updated_at, title, content, metadata) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self.conn.execute("INSERT INTO course_fts(course_fts) VALUES ('optimize')")
+        except Exception as e:
+            if get_script_run_ctx() is None:
+                logger.exception("Failed to reindex courses")
+                raise
+            st.error(f"Failed to reindex courses: {e}")
+
+    # ─── background sync ────────────────────────────────────────────────
+    def _get_state(self, name: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM sync_state WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, name: str, value: str) -> None:
+        with self._write_lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO sync_state (name, value) VALUES (?, ?)", (name, value))
+
+    def sync_from_supabase(self, client=None, page_size: int = 500) -> int:
+        """Pull only courses changed since the last sync and upsert them into the index.
+
+        Walks ``courses`` in (updated_at, id) order with a keyset cursor and
+        stores the watermark after every page, so an interrupted sync resumes
+        where it stopped.
+        """
+        client = client or get_supabase()
+        synced = 0
+        cursor = json.loads(self._get_state("courses_cursor") or "null")
+        while True:
+            query = (
+                client.table("courses")
+                .select(SYNC_COLUMNS)
+                .order("updated_at")
+                .order("id")
+                .limit(page_size)
+            )
+            if cursor:
+                updated_at, last_id = cursor
+                query = query.or_(
+                    f'updated_at.gt."{updated_at}",and(updated_at.eq."{updated_at}",id.gt.{last_id})'
+                )
+            rows = query.execute().data or []
+            if not rows:
+                break
+            synced += self.index_courses(rows)
+            cursor = [rows[-1]["updated_at"], rows[-1]["id"]]
+            self._set_state("courses_cursor", json.dumps(cursor))
+            if len(rows) < page_size:
+                break
+        self._set_state("last_sync_at", str(time.time()))
+        return synced
+
+    def sync_if_stale(self, max_age_seconds: float = 300, max_backoff_seconds: float = 3600) -> bool:
+        """Schedule a background sync when the index is older than max_age_seconds.
+
+        After failed attempts the next one waits max_age_seconds * 2**failures
+        (capped at max_backoff_seconds), so an outage does not turn every page
+        view into another sync.
+        """
+        now = time.time()
+        last_sync = float(self._get_state("last_sync_at") or 0)
+        if now - last_sync < max_age_seconds or self._sync_running.is_set():
+            return False
+        failures = int(self._get_state("sync_failures") or 0)
+        if failures:
+            last_attempt = float(self._get_state("last_sync_attempt_at") or 0)
+            if now - last_attempt < min(max_age_seconds * 2 ** failures, max_backoff_seconds):
+                return False
+
+        from queue import Full
+        from .background_tasks import task_manager, LANE_BATCH
+
+        def _run():
+            try:
+                self._set_state("last_sync_attempt_at", str(time.time()))
+                synced = self.sync_from_supabase()
+                self._set_state("sync_failures", "0")
+                return synced
+            except Exception:
+                logger.exception("Course search sync failed (%d consecutive failures)", failures + 1)
+                self._set_state("sync_failures", str(failures + 1))
+                raise
+            finally:
+                self._sync_running.clear()
+
+        self._sync_running.set()
+        try:
+            task_manager.submit_task(f"course_search_sync_{int(time.time())}", _run, lane=LANE_BATCH, timeout=0)
+        except Full:
+            # Batch lane is saturated; try again on a later page view
+            self._sync_running.clear()
+            return False
+        return True
+
+    # ─── querying ───────────────────────────────────────────────────────
+    @staticmethod
+    def _to_match_query(query: str) -> str:
+        """Turn free text into a safe FTS5 query (quoted terms, prefix match on the last)"""
+        terms = re.findall(r"\w+", query)
+        if not terms:
+            return ""
+        quoted = [f'"{t}"' for t in terms]
+        quoted[-1] += "*"
+        return " ".join(quoted)
 
     def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
-        """Search courses using FTS5"""
+        """Search courses using FTS5 with BM25 weighting between title and content"""
+        match = self._to_match_query(query)
+        if not match:
+            return []
         try:
             cursor = self.conn.execute(
                 """
-                SELECT course_id, title, snippet(course_content, 2, '<mark>', '</mark>', '...', 64) as excerpt,
-                       metadata, rank
-                FROM course_content
-                WHERE course_content MATCH ?
-                ORDER BY rank
+                SELECT d.course_id, d.title,
+                       snippet(course_fts, 1, '<mark>', '</mark>', '...', 24) AS excerpt,
+                       d.metadata, bm25(course_fts, ?, ?) AS score
+                FROM course_fts
+                JOIN course_docs d ON d.rowid = course_fts.rowid
+                WHERE course_fts MATCH ?
+                ORDER BY score
                 LIMIT ?
                 """,
-                (query, limit)
+                (self.title_weight, self.content_weight, match, limit)
             )
-            
+
             results = []
             for row in cursor:
                 result = {
@@ -62,58 +301,50 @@ class CourseSearch:
                     "rank": row[4]
                 }
                 results.append(result)
-            
+
             return results
         except Exception as e:
             st.error(f"Search failed: {e}")
             return []
 
-    def _content_to_text(self, content: Dict[str, Any]) -> str:
-        """Convert course content dictionary to searchable text"""
+    def _content_to_text(self, content: Any) -> str:
+        """Convert course content (dict or JSON string) to searchable text"""
+        if isinstance(content, str):
+            try:
+                content = json.loads(content)
+            except ValueError:
+                return content
+
         text_parts = []
-        
+
         # Extract text from course structure
         if isinstance(content, dict):
             # Add introduction
             if "introduction" in content:
-                text_parts.append(content["introduction"])
-            
+                text_parts.append(str(content["introduction"]))
+
             # Add week content
             for week in content.get("weeks", []):
-                text_parts.append(week)
-            
+                text_parts.append(str(week))
+
+            # Add generated scheme text
+            if content.get("scheme"):
+                text_parts.append(str(content["scheme"]))
+
             # Add conclusion
             if "conclusion" in content:
-                text_parts.append(content["conclusion"])
-            
-            # Add any parameters/metadata
-            params = content.get("parameters", {})
+                text_parts.append(str(content["conclusion"]))
+
+            # Add structured weeks / paragraphs and the remaining parameters
+            params = dict(content.get("parameters", {}) or {})
+            for week in params.pop("course_content", []) or []:
+                for para in week.get("paragraphs", []):
+                    text_parts.append(para.get("paragraph_title", ""))
+                    text_parts.append(para.get("text", ""))
             if params:
                 text_parts.append(str(params))
-        
-        return "\n".join(text_parts)
 
-    def reindex_all_courses(self, courses: List[Dict[str, Any]]):
-        """Reindex all courses in the database"""
-        try:
-            with self.conn:
-                # Clear existing index
-                self.conn.execute("DELETE FROM course_content")
-                
-                # Reindex all courses
-                for course in courses:
-                    self.index_course(
-                        course["id"],
-                        course.get("title", "Untitled"),
-                        course.get("content", {}),
-                        {
-                            "level": course.get("level"),
-                            "rating": course.get("rating"),
-                            "public": course.get("public", False)
-                        }
-                    )
-        except Exception as e:
-            st.error(f"Failed to reindex courses: {e}")
+        return "\n".join(text_parts)
 
 # Initialize global search instance
-search = CourseSearch() 
\ No newline at end of file
+search = CourseSearch()
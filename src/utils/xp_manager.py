@@ -1,81 +1,76 @@
-from typing import Optional
+import math
+from typing import Any, Optional
+import numpy as np
 import streamlit as st
-from supabase import create_client, Client
+from ..api.client_pool import get_supabase
+from .profile_loader import profile_loader
 
-# Initialize Supabase client
-SUPABASE_URL = "https://fcyutudqmkhrywffsjky.supabase.co"
-SUPABASE_ANON_KEY = (
-    "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9."
-    "eyJpc3MiOiJzdXBhYmFzZSIsInJlZiI6ImZjeXV0dWRxbWtocnl3ZmZzamt5Iiwicm9sZSI6ImFub24iLCJpYXQiOjE3NDI0MjQ3OTAsImV4cCI6MjA1ODAwMDc5MH0."
-    "IucZQwgH1CFYFCgb9E3-TV7I-NOnPq9-3lmrWc4ZE7I"
-)
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+# Level n -> n+1 costs BASE_LEVEL_XP + (n-1) * LEVEL_XP_STEP, so reaching
+# level k+1 takes 25k² + 75k XP in total
+BASE_LEVEL_XP = 100
+LEVEL_XP_STEP = 50
+
+def _xp_for_levels_gained(k):
+    return k * BASE_LEVEL_XP + LEVEL_XP_STEP * k * (k - 1) // 2
+
+def level_progress(xp: int) -> tuple[int, float, int, int]:
+    """Return (level, progress_percent, current_level_xp, xp_needed) in O(1).
+
+    Solves 25k² + 75k <= xp for the largest k in integers (k = levels gained)
+    via the arithmetic-series quadratic: (10k + 15)² <= 4xp + 225.
+    """
+    xp = max(int(xp or 0), 0)
+    k = (math.isqrt(4 * xp + 225) - 15) // 10
+    xp_total = _xp_for_levels_gained(k)
+    xp_needed = BASE_LEVEL_XP + LEVEL_XP_STEP * k
+    current_level_xp = xp - xp_total
+    return k + 1, current_level_xp / xp_needed, current_level_xp, xp_needed
+
+def levels_for(xps) -> np.ndarray:
+    """Vectorized levels for many XP values at once (e.g. a whole leaderboard)"""
+    xp = np.maximum(np.asarray(xps, dtype=np.int64), 0)
+    k = ((np.sqrt(4 * xp + 225) - 15) // 10).astype(np.int64)
+    # Correct float rounding at exact level boundaries
+    k -= _xp_for_levels_gained(k) > xp
+    k += _xp_for_levels_gained(k + 1) <= xp
+    return k + 1
 
 class XPManager:
-    def __init__(self):
-        self.xp_rewards = {
-            "course_generation": 10,
-            "course_completion": 25,
-            "course_saved": 45
-        }
+    """Client side of the XP system.
+
+    Amounts live in the server's ``xp_rewards`` table; the client only names
+    the reason and what it refers to, and each (reason, ref) pays out once.
+    Creator rewards (``course_saved``) are awarded by ``save_course_copy``.
+    """
 
-    def add_xp(self, user_id: str, amount: int) -> bool:
-        """Add XP to a user's profile"""
+    def add_xp(self, user_id: str, reason: str, ref: Any) -> bool:
+        """Claim the signed-in user's XP for ``reason``, once per ``ref``"""
         try:
-            # Get current XP
-            response = supabase.table("user_profile").select("xp").eq("user_id", user_id).single().execute()
-            current_xp = response.data.get("xp", 0) if response.data else 0
-            
-            # Add new XP
-            new_xp = current_xp + amount
-            
-            # Update user profile
-            supabase.table("user_profile").update({"xp": new_xp}).eq("user_id", user_id).execute()
+            get_supabase().rpc("increment_xp", {
+                "reason": reason,
+                "ref": str(ref)
+            }).execute()
+            profile_loader.invalidate(user_id)
             return True
         except Exception as e:
             st.error(f"Failed to add XP: {e}")
             return False
 
-    def reward_course_generation(self, user_id: str) -> bool:
-        """Reward user for generating a new course"""
-        return self.add_xp(user_id, self.xp_rewards["course_generation"])
+    def reward_course_generation(self, user_id: str, generation_id: Any) -> bool:
+        """Reward user for generating a new course (``generation_id`` is the webhook's id)"""
+        return self.add_xp(user_id, "course_generation", generation_id)
 
-    def reward_course_completion(self, user_id: str) -> bool:
+    def reward_course_completion(self, user_id: str, course_id: str) -> bool:
         """Reward user for completing a course"""
-        return self.add_xp(user_id, self.xp_rewards["course_completion"])
-
-    def reward_course_saved(self, creator_id: str) -> bool:
-        """Reward course creator when their course is saved by another user"""
-        return self.add_xp(creator_id, self.xp_rewards["course_saved"])
+        return self.add_xp(user_id, "course_completion", course_id)
 
     def get_user_level(self, xp: int) -> int:
         """Calculate user level based on XP"""
-        level = 1
-        xp_needed = 100
-        xp_total = 0
-        
-        while xp >= xp_total + xp_needed:
-            level += 1
-            xp_total += xp_needed
-            xp_needed += 50
-            
-        return level
+        return level_progress(xp)[0]
 
     def get_level_progress(self, xp: int) -> tuple[float, int, int]:
         """Calculate level progress, current XP, and XP needed for next level"""
-        level = 1
-        xp_needed = 100
-        xp_total = 0
-        
-        while xp >= xp_total + xp_needed:
-            level += 1
-            xp_total += xp_needed
-            xp_needed += 50
-            
-        current_level_xp = xp - xp_total
-        progress_percent = current_level_xp / xp_needed if xp_needed else 0
-        
-        return progress_percent, current_level_xp, xp_needed
+        return level_progress(xp)[1:]
 
 # Initialize global XP manager
 xp_manager = XPManager() 
\ No newline at end of file
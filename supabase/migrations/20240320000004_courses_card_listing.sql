@@ -0,0 +1,11 @@
+-- Computed column for the "My Courses" cards: PostgREST exposes it as a
+-- selectable field, so the page can show the notes size without downloading
+-- the notes themselves.
+CREATE OR REPLACE FUNCTION course_notes_length(courses)
+RETURNS INTEGER AS $$
+    SELECT COALESCE(length($1.course_notes), 0);
+$$ LANGUAGE sql STABLE;
+
+-- Create index for keyset pagination of a user's courses (newest first)
+CREATE INDEX IF NOT EXISTS idx_courses_user_created_id
+    ON courses(user_id, created_at DESC, id DESC);
@@ -0,0 +1,102 @@
+-- Comment text rolled up per thread. Generated columns cannot read other
+-- tables, so this part of the document is maintained by a trigger below.
+ALTER TABLE forum_threads ADD COLUMN IF NOT EXISTS comments_tsv TSVECTOR NOT NULL DEFAULT ''::tsvector;
+
+-- Weighted search document: title (A) > body (B) > comments (C)
+ALTER TABLE forum_threads ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(content, '')), 'B') ||
+        setweight(comments_tsv, 'C')
+    ) STORED;
+
+-- Create GIN index for full-text search
+CREATE INDEX IF NOT EXISTS idx_forum_threads_search_vector ON forum_threads USING GIN (search_vector);
+
+-- Create function to keep the comment roll-up in sync
+CREATE OR REPLACE FUNCTION update_thread_comments_tsv()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        -- Appending is enough for new comments
+        UPDATE forum_threads
+        SET comments_tsv = comments_tsv || to_tsvector('english', NEW.content)
+        WHERE id = NEW.thread_id;
+    ELSE
+        -- Edits and deletes rebuild the roll-up for the affected thread
+        UPDATE forum_threads
+        SET comments_tsv = COALESCE((
+            SELECT to_tsvector('english', string_agg(c.content, ' '))
+            FROM forum_comments c
+            WHERE c.thread_id = OLD.thread_id
+        ), ''::tsvector)
+        WHERE id = OLD.thread_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Create trigger for the comment roll-up
+DROP TRIGGER IF EXISTS update_thread_comments_tsv ON forum_comments;
+CREATE TRIGGER update_thread_comments_tsv
+AFTER INSERT OR DELETE OR UPDATE OF content ON forum_comments
+FOR EACH ROW
+EXECUTE FUNCTION update_thread_comments_tsv();
+
+-- Backfill existing comments
+UPDATE forum_threads t
+SET comments_tsv = c.tsv
+FROM (
+    SELECT thread_id, to_tsvector('english', string_agg(content, ' ')) AS tsv
+    FROM forum_comments
+    GROUP BY thread_id
+) c
+WHERE c.thread_id = t.id;
+
+-- Ranked, highlighted, paginated thread search.
+-- total_count is computed over all matches before LIMIT, so the pager needs no
+-- second request; ts_headline only runs for the rows of the requested page.
+CREATE OR REPLACE FUNCTION search_forum_threads(
+    search_query TEXT,
+    category_filter TEXT DEFAULT NULL,
+    page_size INTEGER DEFAULT 10,
+    page_offset INTEGER DEFAULT 0
+)
+RETURNS TABLE (
+    id UUID,
+    title TEXT,
+    content TEXT,
+    category TEXT,
+    user_id UUID,
+    created_at TIMESTAMPTZ,
+    likes INTEGER,
+    comments INTEGER,
+    rank REAL,
+    headline TEXT,
+    total_count BIGINT
+) AS $$
+    WITH q AS (
+        SELECT websearch_to_tsquery('english', search_query) AS query
+    ),
+    page AS (
+        SELECT t.id, t.title, t.content, t.category, t.user_id, t.created_at,
+               t.likes, t.comments,
+               ts_rank_cd(t.search_vector, q.query) AS score,
+               q.query,
+               count(*) OVER () AS total_count
+        FROM forum_threads t, q
+        WHERE t.search_vector @@ q.query
+          AND (category_filter IS NULL OR t.category = category_filter)
+        ORDER BY score DESC, t.created_at DESC, t.id DESC
+        LIMIT page_size OFFSET page_offset
+    )
+    SELECT p.id, p.title, p.content, p.category, p.user_id, p.created_at,
+           p.likes, p.comments, p.score,
+           ts_headline('english', p.content, p.query,
+                       'StartSel=**, StopSel=**, MaxFragments=2, MinWords=10, MaxWords=30') AS headline,
+           p.total_count
+    FROM page p
+    ORDER BY p.score DESC, p.created_at DESC, p.id DESC;
+$$ LANGUAGE sql STABLE;
+
+GRANT EXECUTE ON FUNCTION search_forum_threads(TEXT, TEXT, INTEGER, INTEGER) TO anon, authenticated;
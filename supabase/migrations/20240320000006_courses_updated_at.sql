@@ -0,0 +1,34 @@
+-- Track when a course's searchable/renderable content last changed.
+-- Per-user progress writes (progress, completion, notes) deliberately do not
+-- bump it, so caches keyed by (course_id, updated_at) survive a user paging
+-- through a course.
+ALTER TABLE courses ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT now() NOT NULL;
+
+-- Create function to bump updated_at on content changes
+CREATE OR REPLACE FUNCTION bump_course_updated_at()
+RETURNS TRIGGER AS $$
+DECLARE
+    n JSONB := to_jsonb(NEW);
+    o JSONB := to_jsonb(OLD);
+BEGIN
+    IF n->'title' IS DISTINCT FROM o->'title'
+        OR n->'content' IS DISTINCT FROM o->'content'
+        OR n->'Public' IS DISTINCT FROM o->'Public'
+        OR n->'public' IS DISTINCT FROM o->'public'
+        OR n->'rating' IS DISTINCT FROM o->'rating'
+    THEN
+        NEW.updated_at = now();
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Create trigger for updated_at
+DROP TRIGGER IF EXISTS bump_course_updated_at ON courses;
+CREATE TRIGGER bump_course_updated_at
+BEFORE UPDATE ON courses
+FOR EACH ROW
+EXECUTE FUNCTION bump_course_updated_at();
+
+-- Create index for incremental sync (changed since watermark, keyset on id)
+CREATE INDEX IF NOT EXISTS idx_courses_updated_at_id ON courses(updated_at, id);
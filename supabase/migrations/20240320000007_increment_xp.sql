@@ -0,0 +1,124 @@
+-- XP amounts are fixed per reason on the server; clients only name the reason.
+-- self_award marks reasons a user may claim for themselves via increment_xp;
+-- the others are awarded only by trusted SECURITY DEFINER functions.
+CREATE TABLE IF NOT EXISTS xp_rewards (
+    reason TEXT PRIMARY KEY,
+    amount INTEGER NOT NULL CHECK (amount > 0),
+    self_award BOOLEAN NOT NULL DEFAULT false
+);
+
+INSERT INTO xp_rewards (reason, amount, self_award) VALUES
+    ('course_generation', 10, true),
+    ('course_completion', 25, true),
+    ('course_progress_complete', 100, false),
+    ('course_saved', 45, false)
+ON CONFLICT (reason) DO UPDATE SET amount = excluded.amount, self_award = excluded.self_award;
+
+-- Enable Row Level Security (read-only for clients)
+ALTER TABLE xp_rewards ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "XP rewards are viewable by everyone"
+    ON xp_rewards FOR SELECT
+    USING (true);
+
+-- Create xp_ledger table: one row per XP award
+CREATE TABLE IF NOT EXISTS xp_ledger (
+    id BIGSERIAL PRIMARY KEY,
+    user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+    amount INTEGER NOT NULL,
+    reason TEXT NOT NULL REFERENCES xp_rewards(reason),
+    ref TEXT NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT now() NOT NULL
+);
+
+-- Create index for per-user history
+CREATE INDEX IF NOT EXISTS idx_xp_ledger_user_created ON xp_ledger(user_id, created_at DESC);
+
+-- Each (user, reason, ref) is rewarded at most once, e.g. one completion per course
+CREATE UNIQUE INDEX IF NOT EXISTS idx_xp_ledger_award ON xp_ledger(user_id, reason, ref);
+
+-- Enable Row Level Security
+ALTER TABLE xp_ledger ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view their own XP history"
+    ON xp_ledger FOR SELECT
+    TO authenticated
+    USING (auth.uid() = user_id);
+
+-- Create internal function to award XP atomically.
+-- The ledger insert claims (user, reason, ref) first, so a repeated award is
+-- a no-op; the UPDATE then reads and writes xp under one row lock, so
+-- concurrent awards cannot overwrite each other. Returns the new XP total,
+-- or NULL if nothing was awarded. Not callable by clients.
+CREATE OR REPLACE FUNCTION award_xp(target_user_id UUID, reason TEXT, ref TEXT)
+RETURNS INTEGER AS $$
+DECLARE
+    reward INTEGER;
+    new_xp INTEGER;
+BEGIN
+    SELECT r.amount INTO reward FROM xp_rewards r WHERE r.reason = award_xp.reason;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Unknown XP reason %', award_xp.reason;
+    END IF;
+
+    IF NOT EXISTS (SELECT 1 FROM user_profile p WHERE p.user_id = target_user_id) THEN
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO xp_ledger (user_id, amount, reason, ref)
+    VALUES (target_user_id, reward, award_xp.reason, award_xp.ref)
+    ON CONFLICT (user_id, reason, ref) DO NOTHING;
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+
+    UPDATE user_profile p
+    SET xp = COALESCE(p.xp, 0) + reward
+    WHERE p.user_id = target_user_id
+    RETURNING p.xp INTO new_xp;
+
+    RETURN new_xp;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION award_xp(UUID, TEXT, TEXT) FROM PUBLIC, anon, authenticated;
+
+-- Create function for users to claim their own rewards.
+-- Only self_award reasons are accepted, always for auth.uid(). For
+-- course_completion, ref must be a completed course the caller owns. For
+-- course_generation, ref is the id returned by the generation webhook (not a
+-- course id); a claim needs a generated course (one with its own content)
+-- that has not been rewarded yet, checked under the profile row lock.
+CREATE OR REPLACE FUNCTION increment_xp(reason TEXT, ref TEXT)
+RETURNS INTEGER AS $$
+BEGIN
+    IF auth.uid() IS NULL THEN
+        RAISE EXCEPTION 'Not authenticated';
+    END IF;
+
+    IF NOT EXISTS (SELECT 1 FROM xp_rewards r WHERE r.reason = increment_xp.reason AND r.self_award) THEN
+        RAISE EXCEPTION 'XP for % cannot be self-awarded', increment_xp.reason;
+    END IF;
+
+    IF increment_xp.reason = 'course_generation' THEN
+        PERFORM 1 FROM user_profile p WHERE p.user_id = auth.uid() FOR UPDATE;
+        IF (SELECT count(*) FROM courses c WHERE c.user_id = auth.uid() AND c.content IS NOT NULL)
+            <= (SELECT count(*) FROM xp_ledger l WHERE l.user_id = auth.uid() AND l.reason = 'course_generation')
+        THEN
+            RAISE EXCEPTION 'No generated course left to reward';
+        END IF;
+    ELSIF NOT EXISTS (
+        SELECT 1 FROM courses c
+        WHERE c.id::text = increment_xp.ref
+          AND c.user_id = auth.uid()
+          AND c.completed
+    ) THEN
+        RAISE EXCEPTION 'Course not eligible for %', increment_xp.reason;
+    END IF;
+
+    RETURN award_xp(auth.uid(), increment_xp.reason, increment_xp.ref);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION increment_xp(TEXT, TEXT) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION increment_xp(TEXT, TEXT) TO authenticated;
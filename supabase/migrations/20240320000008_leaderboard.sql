@@ -0,0 +1,151 @@
+-- XP leaderboard, kept in sync with user_profile.xp by a trigger.
+-- rank is competition rank (1 + number of users with more XP). It is computed
+-- at read time with an index-only count over idx_leaderboard_xp, so an XP
+-- award is a single-row update instead of re-ranking everyone it overtakes.
+CREATE TABLE IF NOT EXISTS leaderboard (
+    user_id UUID PRIMARY KEY REFERENCES auth.users(id) ON DELETE CASCADE,
+    xp INTEGER NOT NULL DEFAULT 0
+);
+
+-- Create index for rank counts and (xp DESC, user_id) keyset paging
+CREATE INDEX IF NOT EXISTS idx_leaderboard_xp ON leaderboard(xp DESC, user_id);
+
+-- Row count for percentiles, so they never need count(*)
+CREATE TABLE IF NOT EXISTS leaderboard_stats (
+    id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+    total INTEGER NOT NULL DEFAULT 0
+);
+
+-- Enable Row Level Security (writes only happen through the trigger)
+ALTER TABLE leaderboard ENABLE ROW LEVEL SECURITY;
+ALTER TABLE leaderboard_stats ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Leaderboard is viewable by everyone"
+    ON leaderboard FOR SELECT
+    USING (true);
+
+CREATE POLICY "Leaderboard stats are viewable by everyone"
+    ON leaderboard_stats FOR SELECT
+    USING (true);
+
+-- Backfill
+INSERT INTO leaderboard (user_id, xp)
+SELECT user_id, COALESCE(xp, 0)
+FROM user_profile
+ON CONFLICT (user_id) DO UPDATE SET xp = excluded.xp;
+
+INSERT INTO leaderboard_stats (id, total)
+SELECT true, count(*) FROM leaderboard
+ON CONFLICT (id) DO UPDATE SET total = excluded.total;
+
+-- Create function to keep the leaderboard in sync with user_profile.xp
+CREATE OR REPLACE FUNCTION maintain_leaderboard()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO leaderboard (user_id, xp)
+        VALUES (NEW.user_id, COALESCE(NEW.xp, 0))
+        ON CONFLICT (user_id) DO NOTHING;
+        IF FOUND THEN
+            UPDATE leaderboard_stats SET total = total + 1;
+        END IF;
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'DELETE' THEN
+        DELETE FROM leaderboard WHERE user_id = OLD.user_id;
+        IF FOUND THEN
+            UPDATE leaderboard_stats SET total = total - 1;
+        END IF;
+        RETURN NULL;
+    END IF;
+
+    UPDATE leaderboard SET xp = COALESCE(NEW.xp, 0) WHERE user_id = NEW.user_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Create trigger for the leaderboard
+DROP TRIGGER IF EXISTS maintain_leaderboard ON user_profile;
+CREATE TRIGGER maintain_leaderboard
+AFTER INSERT OR DELETE OR UPDATE OF xp ON user_profile
+FOR EACH ROW
+EXECUTE FUNCTION maintain_leaderboard();
+
+-- Create function for the competition rank of an XP value
+CREATE OR REPLACE FUNCTION leaderboard_rank(xp INTEGER)
+RETURNS INTEGER AS $$
+    SELECT 1 + count(*)::INTEGER FROM leaderboard l WHERE l.xp > $1;
+$$ LANGUAGE sql STABLE;
+
+-- One page of the leaderboard, keyset-paged on (xp DESC, user_id)
+CREATE OR REPLACE FUNCTION get_leaderboard(
+    page_size INTEGER DEFAULT 20,
+    after_xp INTEGER DEFAULT NULL,
+    after_user_id UUID DEFAULT NULL
+)
+RETURNS TABLE (
+    rank INTEGER,
+    user_id UUID,
+    profile_name TEXT,
+    xp INTEGER,
+    percentile NUMERIC
+) AS $$
+    WITH page AS (
+        SELECT l.user_id, l.xp FROM leaderboard l
+        WHERE after_xp IS NULL
+           OR l.xp < after_xp
+           OR (l.xp = after_xp AND l.user_id > COALESCE(after_user_id, '00000000-0000-0000-0000-000000000000'::uuid))
+        ORDER BY l.xp DESC, l.user_id
+        LIMIT page_size
+    )
+    SELECT r.rank, pg.user_id, p.profile_name, pg.xp,
+           round(100.0 * (s.total - r.rank) / greatest(s.total, 1), 1) AS percentile
+    FROM page pg
+    CROSS JOIN LATERAL (SELECT leaderboard_rank(pg.xp) AS rank) r
+    JOIN leaderboard_stats s ON true
+    LEFT JOIN user_profile p ON p.user_id = pg.user_id
+    ORDER BY pg.xp DESC, pg.user_id;
+$$ LANGUAGE sql STABLE;
+
+-- A user's rank and percentile plus the users just above and below
+CREATE OR REPLACE FUNCTION get_leaderboard_position(
+    target_user_id UUID,
+    neighbors INTEGER DEFAULT 2
+)
+RETURNS TABLE (
+    rank INTEGER,
+    user_id UUID,
+    profile_name TEXT,
+    xp INTEGER,
+    percentile NUMERIC,
+    is_target BOOLEAN
+) AS $$
+    WITH me AS (
+        SELECT l.user_id, l.xp FROM leaderboard l WHERE l.user_id = target_user_id
+    ),
+    around AS (
+        (SELECT l.user_id, l.xp FROM leaderboard l, me
+         WHERE l.xp > me.xp OR (l.xp = me.xp AND l.user_id < me.user_id)
+         ORDER BY l.xp, l.user_id DESC
+         LIMIT neighbors)
+        UNION ALL
+        (SELECT me.user_id, me.xp FROM me)
+        UNION ALL
+        (SELECT l.user_id, l.xp FROM leaderboard l, me
+         WHERE l.xp < me.xp OR (l.xp = me.xp AND l.user_id > me.user_id)
+         ORDER BY l.xp DESC, l.user_id
+         LIMIT neighbors)
+    )
+    SELECT r.rank, a.user_id, p.profile_name, a.xp,
+           round(100.0 * (s.total - r.rank) / greatest(s.total, 1), 1) AS percentile,
+           a.user_id = target_user_id AS is_target
+    FROM around a
+    CROSS JOIN LATERAL (SELECT leaderboard_rank(a.xp) AS rank) r
+    JOIN leaderboard_stats s ON true
+    LEFT JOIN user_profile p ON p.user_id = a.user_id
+    ORDER BY a.xp DESC, a.user_id;
+$$ LANGUAGE sql STABLE;
+
+GRANT EXECUTE ON FUNCTION get_leaderboard(INTEGER, INTEGER, UUID) TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION get_leaderboard_position(UUID, INTEGER) TO anon, authenticated;
@@ -0,0 +1,85 @@
+-- Course progress is written through save_course_progress, which also detects
+-- completion server-side so clients no longer read and write XP per click.
+ALTER TABLE courses ADD COLUMN IF NOT EXISTS progress_completed BOOLEAN DEFAULT false NOT NULL;
+
+-- Completion counts of the current content: the last week and the number of
+-- checkable items (paragraph resources) in it. Content is often malformed LLM
+-- JSON text, so they are computed by the app's course parser (the same one
+-- that builds the checkboxes) when the course is opened, not in SQL.
+ALTER TABLE courses ADD COLUMN IF NOT EXISTS week_count INTEGER;
+ALTER TABLE courses ADD COLUMN IF NOT EXISTS last_week_items INTEGER;
+
+-- Create function to reset the counts when the content changes without them
+CREATE OR REPLACE FUNCTION reset_course_completion_counts()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.week_count IS NOT DISTINCT FROM OLD.week_count
+        AND NEW.last_week_items IS NOT DISTINCT FROM OLD.last_week_items
+    THEN
+        NEW.week_count = NULL;
+        NEW.last_week_items = NULL;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Create trigger for completion counts
+DROP TRIGGER IF EXISTS reset_course_completion_counts ON courses;
+CREATE TRIGGER reset_course_completion_counts
+BEFORE UPDATE OF content ON courses
+FOR EACH ROW
+WHEN (NEW.content IS DISTINCT FROM OLD.content)
+EXECUTE FUNCTION reset_course_completion_counts();
+
+-- Create function to store a course's progress and award completion once.
+-- The client only claims completion (checked_week, checked_items); the
+-- course counts as viewed when checked_week is its last week and every item
+-- of that week is checked, according to the stored completion counts. The
+-- conditional UPDATE flips progress_completed at most once under the row
+-- lock, so retried or concurrent flushes cannot award the XP twice.
+-- Returns true only for the call that completed the course.
+CREATE OR REPLACE FUNCTION save_course_progress(
+    target_course_id UUID,
+    new_progress INTEGER,
+    checked_week INTEGER DEFAULT NULL,
+    checked_items INTEGER DEFAULT NULL
+)
+RETURNS BOOLEAN AS $$
+DECLARE
+    owner_id UUID;
+    already_completed BOOLEAN;
+    weeks INTEGER;
+    week_total INTEGER;
+BEGIN
+    UPDATE courses c
+    SET progress = GREATEST(new_progress, 0)
+    WHERE c.id = target_course_id AND c.user_id = auth.uid()
+    RETURNING c.user_id, c.progress_completed, c.week_count, c.last_week_items
+    INTO owner_id, already_completed, weeks, week_total;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Course not found';
+    END IF;
+
+    IF already_completed OR checked_week IS NULL OR checked_items IS NULL THEN
+        RETURN false;
+    END IF;
+
+    IF weeks IS NULL OR checked_week <> weeks OR COALESCE(week_total, 0) <= 0 OR checked_items < week_total THEN
+        RETURN false;
+    END IF;
+
+    UPDATE courses
+    SET progress_completed = true
+    WHERE id = target_course_id AND NOT progress_completed;
+
+    IF NOT FOUND THEN
+        RETURN false;
+    END IF;
+
+    PERFORM award_xp(owner_id, 'course_progress_complete', target_course_id::text);
+    RETURN true;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+GRANT EXECUTE ON FUNCTION save_course_progress(UUID, INTEGER, INTEGER, INTEGER) TO authenticated;
@@ -0,0 +1,70 @@
+-- Paragraph explanations keyed by a hash of the paragraph text, so every copy
+-- of a course (and any course repeating a paragraph) shares one explanation.
+-- content_hash is the hex SHA-256 of explanation_json->>'input_text'.
+CREATE TABLE IF NOT EXISTS explanation_cache (
+    content_hash TEXT PRIMARY KEY,
+    explanation_json JSONB NOT NULL,
+    model TEXT,
+    -- Signed-in user who stored the row; NULL for trusted (service-role) writes
+    created_by UUID REFERENCES auth.users(id) ON DELETE SET NULL,
+    created_at TIMESTAMPTZ DEFAULT now() NOT NULL
+);
+
+-- Enable Row Level Security (writes only happen through store_explanation)
+ALTER TABLE explanation_cache ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Explanations are viewable by everyone"
+    ON explanation_cache FOR SELECT
+    USING (true);
+
+-- Create function to store an explanation under its content hash.
+-- The hash is checked against the text, so a key can only ever hold an
+-- explanation of that exact paragraph. Signed-in users may fill an empty key
+-- (recorded as created_by); only the service role (the warm-up worker) may
+-- replace an existing explanation. Anonymous callers cannot write.
+CREATE OR REPLACE FUNCTION store_explanation(content_hash TEXT, explanation_json JSONB, model TEXT DEFAULT NULL)
+RETURNS VOID AS $$
+BEGIN
+    IF store_explanation.content_hash IS DISTINCT FROM
+        encode(sha256(convert_to(store_explanation.explanation_json->>'input_text', 'UTF8')), 'hex')
+    THEN
+        RAISE EXCEPTION 'content_hash does not match input_text';
+    END IF;
+
+    IF auth.role() = 'service_role' THEN
+        INSERT INTO explanation_cache (content_hash, explanation_json, model, created_by)
+        VALUES (store_explanation.content_hash, store_explanation.explanation_json, store_explanation.model, NULL)
+        ON CONFLICT ON CONSTRAINT explanation_cache_pkey DO UPDATE
+        SET explanation_json = excluded.explanation_json,
+            model = excluded.model,
+            created_by = NULL,
+            created_at = now();
+        RETURN;
+    END IF;
+
+    IF auth.uid() IS NULL THEN
+        RAISE EXCEPTION 'Not authenticated';
+    END IF;
+
+    INSERT INTO explanation_cache (content_hash, explanation_json, model, created_by)
+    VALUES (store_explanation.content_hash, store_explanation.explanation_json, store_explanation.model, auth.uid())
+    ON CONFLICT ON CONSTRAINT explanation_cache_pkey DO NOTHING;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION store_explanation(TEXT, JSONB, TEXT) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION store_explanation(TEXT, JSONB, TEXT) TO authenticated, service_role;
+
+-- Seed from explanations already generated per course. input_text is
+-- trimmed first so the keys match content_hash() in the app.
+INSERT INTO explanation_cache (content_hash, explanation_json)
+SELECT DISTINCT ON (1)
+    encode(sha256(convert_to(e.explanation->>'input_text', 'UTF8')), 'hex'),
+    e.explanation
+FROM (
+    SELECT jsonb_set(p.explanation, '{input_text}', to_jsonb(btrim(p.explanation->>'input_text', E' \t\n\r\f\x0b'))) AS explanation
+    FROM (SELECT explanation_json::jsonb AS explanation FROM paragraph_explanations) p
+    WHERE p.explanation->>'input_text' IS NOT NULL
+) e
+ORDER BY 1
+ON CONFLICT DO NOTHING;
@@ -0,0 +1,149 @@
+-- Immutable, content-addressed course bodies shared by every saved copy.
+-- A copy made from the Libraries page stores only per-user state (progress,
+-- completion, notes) and points at the original's content/project by hash.
+CREATE TABLE IF NOT EXISTS course_blobs (
+    content_hash TEXT PRIMARY KEY,
+    content JSONB,
+    project JSONB,
+    created_at TIMESTAMPTZ DEFAULT now() NOT NULL
+);
+
+ALTER TABLE courses ADD COLUMN IF NOT EXISTS blob_hash TEXT REFERENCES course_blobs(content_hash);
+
+-- Create index for "how many copies share this blob"
+CREATE INDEX IF NOT EXISTS idx_courses_blob_hash ON courses(blob_hash) WHERE blob_hash IS NOT NULL;
+
+-- Enable Row Level Security (blobs are written only by save_course_copy)
+ALTER TABLE course_blobs ENABLE ROW LEVEL SECURITY;
+
+-- Create function to check blob visibility: a blob is as visible as the
+-- courses that reference it, i.e. readable when a public course points at it
+-- or the caller owns one that does. Runs as definer so the check does not
+-- depend on the caller's view of courses.
+CREATE OR REPLACE FUNCTION course_blob_visible(hash TEXT)
+RETURNS BOOLEAN AS $$
+    SELECT EXISTS (
+        SELECT 1 FROM courses c
+        WHERE c.blob_hash = hash
+          AND (
+              (auth.uid() IS NOT NULL AND c.user_id = auth.uid())
+              OR COALESCE((to_jsonb(c)->>'public')::boolean, (to_jsonb(c)->>'Public')::boolean, false)
+          )
+    );
+$$ LANGUAGE sql STABLE SECURITY DEFINER SET search_path = public;
+
+CREATE POLICY "Course blobs are viewable with their courses"
+    ON course_blobs FOR SELECT
+    TO anon, authenticated
+    USING (course_blob_visible(content_hash));
+
+-- Create function to drop a blob once no course references it any more.
+-- save_course_copy locks the blob FOR KEY SHARE before referencing it, so a
+-- concurrent save either makes this DELETE wait and then fail on the new
+-- reference (ignored), or finds the blob gone and recreates it.
+CREATE OR REPLACE FUNCTION gc_course_blob()
+RETURNS TRIGGER AS $$
+BEGIN
+    BEGIN
+        DELETE FROM course_blobs b
+        WHERE b.content_hash = OLD.blob_hash
+          AND NOT EXISTS (SELECT 1 FROM courses c WHERE c.blob_hash = OLD.blob_hash);
+    EXCEPTION WHEN foreign_key_violation THEN
+        NULL;
+    END;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Create triggers for blob garbage collection
+DROP TRIGGER IF EXISTS gc_course_blob_on_delete ON courses;
+CREATE TRIGGER gc_course_blob_on_delete
+AFTER DELETE ON courses
+FOR EACH ROW
+WHEN (OLD.blob_hash IS NOT NULL)
+EXECUTE FUNCTION gc_course_blob();
+
+DROP TRIGGER IF EXISTS gc_course_blob_on_update ON courses;
+CREATE TRIGGER gc_course_blob_on_update
+AFTER UPDATE OF blob_hash ON courses
+FOR EACH ROW
+WHEN (OLD.blob_hash IS NOT NULL AND OLD.blob_hash IS DISTINCT FROM NEW.blob_hash)
+EXECUTE FUNCTION gc_course_blob();
+
+-- Computed columns: a course's own value, falling back to its shared blob.
+-- A project generated later for a copy is stored on the copy and wins.
+CREATE OR REPLACE FUNCTION course_content(courses)
+RETURNS JSONB AS $$
+    SELECT COALESCE(to_jsonb($1.content), (SELECT b.content FROM course_blobs b WHERE b.content_hash = $1.blob_hash));
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION course_project(courses)
+RETURNS JSONB AS $$
+    SELECT COALESCE(to_jsonb($1.project), (SELECT b.project FROM course_blobs b WHERE b.content_hash = $1.blob_hash));
+$$ LANGUAGE sql STABLE;
+
+-- Create function to save a public course into the caller's library.
+-- The blob is created once per distinct (content, project) and reused by all
+-- later copies, so a save is one small INSERT whatever the course size.
+-- The creator is rewarded once per (saver, source course), so re-saving the
+-- same course cannot farm XP. Returns the new course id and the creator.
+CREATE OR REPLACE FUNCTION save_course_copy(source_course_id UUID)
+RETURNS TABLE (course_id UUID, creators_id UUID) AS $$
+DECLARE
+    src courses%ROWTYPE;
+    hash TEXT;
+    new_id UUID;
+BEGIN
+    IF auth.uid() IS NULL THEN
+        RAISE EXCEPTION 'Not authenticated';
+    END IF;
+
+    SELECT * INTO src FROM courses c WHERE c.id = source_course_id;
+    IF NOT FOUND OR NOT COALESCE((to_jsonb(src)->>'public')::boolean, (to_jsonb(src)->>'Public')::boolean, false) THEN
+        RAISE EXCEPTION 'Course not found';
+    END IF;
+
+    -- The blob row is locked FOR KEY SHARE before the copy references it, so
+    -- gc_course_blob cannot delete it in between
+    IF src.blob_hash IS NOT NULL AND src.content IS NULL AND src.project IS NULL THEN
+        -- Saving a copy: share the blob it already points at
+        hash := src.blob_hash;
+        PERFORM 1 FROM course_blobs b WHERE b.content_hash = hash FOR KEY SHARE;
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'Course not found';
+        END IF;
+    ELSE
+        hash := encode(sha256(convert_to(
+            jsonb_build_array(course_content(src), course_project(src))::text, 'UTF8'
+        )), 'hex');
+        LOOP
+            INSERT INTO course_blobs (content_hash, content, project)
+            VALUES (hash, course_content(src), course_project(src))
+            ON CONFLICT ON CONSTRAINT course_blobs_pkey DO NOTHING;
+            -- Retry if a concurrent GC removed the existing row after the insert skipped it
+            PERFORM 1 FROM course_blobs b WHERE b.content_hash = hash FOR KEY SHARE;
+            EXIT WHEN FOUND;
+        END LOOP;
+    END IF;
+
+    INSERT INTO courses (
+        title, course_topic, course_length, skill_level, resource_type, emphasis,
+        knowledge, learning_curve, creators_id, blob_hash, week_count, last_week_items,
+        user_id, progress, checked, completed, completition, course_notes
+    )
+    VALUES (
+        src.title, src.course_topic, src.course_length, src.skill_level, src.resource_type, src.emphasis,
+        src.knowledge, src.learning_curve, src.creators_id, hash, src.week_count, src.last_week_items,
+        auth.uid(), 0, false, false, 0, ''
+    )
+    RETURNING id INTO new_id;
+
+    IF src.creators_id IS NOT NULL AND src.creators_id <> auth.uid() THEN
+        PERFORM award_xp(src.creators_id, 'course_saved', source_course_id::text || ':' || auth.uid()::text);
+    END IF;
+
+    RETURN QUERY SELECT new_id, src.creators_id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+GRANT EXECUTE ON FUNCTION save_course_copy(UUID) TO authenticated;